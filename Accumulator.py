@@ -0,0 +1,251 @@
+#!/usr/bin/env python2
+
+""" Author: Basil Schneider <basil.schneider@cern.ch>
+Fill ROOT histograms from arrays. """
+
+import numpy as np
+from Profiler import Profiler
+
+# Types of the bin contents of the histogram classes (TH1F is a TArrayF
+# etc.)
+_array_types = [('TArrayD', np.float64), ('TArrayF', np.float32),
+                ('TArrayI', np.int32), ('TArrayS', np.int16),
+                ('TArrayC', np.int8)]
+
+def get_buffers(histogram):
+
+    """ Return copies of the arrays of bin contents and of sums of squared
+    weights of a ROOT histogram (including underflow and overflow bins), read
+    from its buffers without a call per bin. Without stored sums of squared
+    weights, they are the contents (like TH1::GetBinError). """
+
+    no_cells = histogram.GetNcells()
+    for array_type, dtype in _array_types:
+        if histogram.InheritsFrom(array_type):
+            break
+    else:
+        raise TypeError('Unknown type of bin contents of %s.'
+                        % histogram.GetName())
+
+    sumw = _read_buffer(histogram.GetArray(), dtype, no_cells)
+    if histogram.GetSumw2N() > 0:
+        sumw2 = _read_buffer(histogram.GetSumw2().GetArray(), np.float64,
+                             no_cells)
+    else:
+        sumw2 = np.abs(sumw)
+
+    return sumw, sumw2
+
+def _read_buffer(buffer, dtype, size):
+
+    """ Return copy of size values of dtype of a PyROOT buffer as array of
+    float64. """
+
+    # Buffers of older PyROOT versions do not know their size
+    if hasattr(buffer, 'SetSize'):
+        buffer.SetSize(size)
+
+    return np.frombuffer(buffer, dtype=dtype, count=size).astype(np.float64)
+
+class Accumulator(object):
+
+    """ Accumulate the content of a ROOT histogram (TH1 or TH2) in arrays and
+    transfer it to the histogram at once. This replaces calling Fill() for
+    every entry.
+
+    The bin numbering is the one of ROOT, i.e. bin 0 is the underflow bin, bin
+    n+1 the overflow bin, and the global bin of a 2d histogram is
+    binx + (nx+2)*biny. """
+
+    def __init__(self, histogram):
+
+        """ Initialize instances for histogram. The current content of the
+        histogram is kept. """
+
+        self._histogram = histogram
+
+        # Binning of all axes, bin edges are only needed for variable bin
+        # sizes
+        axes = [histogram.GetXaxis(), histogram.GetYaxis()]
+        self._axes = []
+        for axis in axes[:histogram.GetDimension()]:
+            edges = None
+            if axis.IsVariableBinSize():
+                edges = np.array([axis.GetBinLowEdge(idx) for idx
+                                  in range(1, axis.GetNbins()+2)])
+            self._axes.append((axis.GetNbins(), axis.GetXmin(),
+                               axis.GetXmax(), edges))
+        self._no_cells = self._get_no_cells()
+
+        # Sum of weights and sum of squared weights for each bin, read at once
+        # from the buffers of the histogram (new histograms are empty)
+        self._entries = histogram.GetEntries()
+        if self._entries == 0:
+            self._sumw = np.zeros(self._no_cells)
+            self._sumw2 = np.zeros(self._no_cells)
+        else:
+            self._sumw, self._sumw2 = get_buffers(histogram)
+
+        # Histograms filled with weights different from 1 store the sum of
+        # squared weights (like TH1::Fill does)
+        self._weighted = histogram.GetSumw2N() > 0
+
+    @classmethod
+    def from_axes(cls, axes):
+
+        """ Return empty accumulator without histogram (so without ROOT) for
+        the fixed binnings axes, a list of (number of bins, minimum, maximum)
+        for each axis. It can be filled and added to an accumulator of a
+        histogram with the same binning. """
+
+        accumulator = cls.__new__(cls)
+        accumulator._histogram = None
+        accumulator._axes = [(no_bins, float(x_min), float(x_max), None)
+                             for no_bins, x_min, x_max in axes]
+        accumulator._no_cells = accumulator._get_no_cells()
+        accumulator._sumw = np.zeros(accumulator._no_cells)
+        accumulator._sumw2 = np.zeros(accumulator._no_cells)
+        accumulator._entries = 0.
+        accumulator._weighted = False
+
+        return accumulator
+
+    def fill(self, x, y=None, weights=None, variances=None):
+
+        """ Fill arrays of values into histogram. weights are the weights of
+        the entries (default 1), variances the sum of squared weights each
+        entry stands for (default weights**2). Return self. """
+
+        bins = self._find_bins(x, y)
+
+        if weights is None:
+            weights = np.ones(len(bins))
+        else:
+            weights = np.asarray(weights, dtype=np.float64)
+            self._weighted |= bool(np.any(weights != 1.))
+        if variances is None:
+            variances = weights**2
+
+        self._sumw += np.bincount(bins, weights, self._no_cells)
+        self._sumw2 += np.bincount(bins, variances, self._no_cells)
+        self._entries += len(bins)
+        Profiler.count('entries_filled', len(bins))
+
+        return self
+
+    def fill_counts(self, x, y=None, counts=None, weight=1.):
+
+        """ Fill arrays of values into histogram, each value counts times
+        with the given weight. This gives the same histogram as filling each
+        entry on its own. Return self. """
+
+        bins = self._find_bins(x, y)
+        counts = np.asarray(counts, dtype=np.float64).ravel()
+        self._weighted |= weight != 1.
+
+        self._sumw += np.bincount(bins, counts*weight, self._no_cells)
+        self._sumw2 += np.bincount(bins, counts*weight**2, self._no_cells)
+        self._entries += counts.sum()
+        Profiler.count('entries_filled', int(counts.sum()))
+
+        return self
+
+    def add(self, other):
+
+        """ Add content of accumulator other with the same binning (e.g.
+        filled in another process). Return self. """
+
+        if [axis[:3] for axis in self._axes] != \
+           [axis[:3] for axis in other._axes]:
+            raise TypeError('The accumulators have different binnings.')
+
+        self._sumw += other._sumw
+        self._sumw2 += other._sumw2
+        self._entries += other._entries
+        self._weighted |= other._weighted
+
+        return self
+
+    def divide(self, other):
+
+        """ Divide content bin by bin by the one of accumulator other with the
+        same binning, like TH1::Divide: errors are propagated as uncorrelated,
+        bins where other is 0 are set to 0. Return self. """
+
+        if [axis[:3] for axis in self._axes] != \
+           [axis[:3] for axis in other._axes]:
+            raise TypeError('The accumulators have different binnings.')
+
+        nonzero = other._sumw != 0
+        sumw = np.zeros(self._no_cells)
+        sumw2 = np.zeros(self._no_cells)
+        c1 = self._sumw[nonzero]
+        c2 = other._sumw[nonzero]
+        sumw[nonzero] = c1/c2
+        sumw2[nonzero] = (self._sumw2[nonzero]*c2**2 +
+                          other._sumw2[nonzero]*c1**2)/c2**4
+        self._sumw = sumw
+        self._sumw2 = sumw2
+        self._weighted = True
+
+        return self
+
+    def flush(self):
+
+        """ Transfer content and errors to the histogram. Return the
+        histogram. """
+
+        self._histogram.SetContent(self._sumw)
+        if self._weighted:
+            self._histogram.Sumw2()
+            self._histogram.SetError(np.sqrt(self._sumw2))
+        self._histogram.SetEntries(self._entries)
+        Profiler.count('histograms_filled')
+
+        return self._histogram
+
+    def get_content(self):
+
+        """ Return array of bin contents (including underflow and overflow
+        bins). """
+
+        return self._sumw
+
+    def _get_no_cells(self):
+
+        """ Return number of bins including underflow and overflow bins. """
+
+        no_cells = 1
+        for no_bins, _, _, _ in self._axes:
+            no_cells *= no_bins + 2
+
+        return no_cells
+
+    def _find_bins(self, x, y):
+
+        """ Return global bin numbers for arrays of values. """
+
+        values = [x] if y is None else [x, y]
+        if len(values) != len(self._axes):
+            raise TypeError('The histogram has %s dimensions, but %s arrays of '
+                            'values were given.'
+                            % (len(self._axes), len(values)))
+
+        bins = np.zeros(len(values[0]), dtype=np.int64)
+        stride = 1
+        for (no_bins, x_min, x_max, edges), value in zip(self._axes, values):
+            value = np.asarray(value, dtype=np.float64)
+            if edges is None:
+                # Same calculation as in TAxis::FindBin
+                with np.errstate(invalid='ignore'):
+                    bins_axis = 1 + np.floor(no_bins*(value - x_min) /
+                                             (x_max - x_min))
+                bins_axis[value < x_min] = 0
+                bins_axis[(value >= x_max) | np.isnan(value)] = no_bins + 1
+                bins_axis = bins_axis.astype(np.int64)
+            else:
+                bins_axis = np.searchsorted(edges, value, side='right')
+            bins += stride*bins_axis
+            stride *= no_bins + 2
+
+        return bins
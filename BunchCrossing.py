@@ -5,8 +5,9 @@ Simple plotting script to visualize the output of the MPA Light synchronous
 readout (bunch crossing data). """
 
 from os import system
-from ROOT import TH1F, THStack, TLegend
 from Plotter import Plotter
+from Accumulator import Accumulator
+from LazyRoot import get_root
 
 class BunchCrossing(Plotter):
 
@@ -23,33 +24,31 @@ class BunchCrossing(Plotter):
 
         """ Plots counts vs. bunch crossing. """
 
+        ROOT = get_root()
+
         system('mkdir -p %s' % path)
         name = 'counts_per_bx_MPA%s'
         x_title = 'BX'
         y_title = 'Event count'
 
-        # Get number of shutters
-        no_shutters = len(self._MPAs[0].get_no_hits_shutter())
-
         # Create THStack and its TLegend
-        stack = THStack(name % ('all'), name % ('all'))
-        leg = TLegend(.9, .5, 1., .9)
+        stack = ROOT.THStack(name % ('all'), name % ('all'))
+        leg = ROOT.TLegend(.9, .5, 1., .9)
 
         # Get max of all MPA's
         max_bx = 0
         for MPA in self._MPAs:
             max_bx = max(max_bx, MPA.get_max())
 
-        # Plots for each pixel and each MPA
-        for idx_mpa, MPA in enumerate(self._MPAs):
+        # Counts of each MPA (in parallel with jobs > 1)
+        accs_mpa = self._map_mpas('_fill_cts_bx')
 
-            # Histogram for one MPA
-            h_mpa = TH1F(name % (idx_mpa), name % (idx_mpa), 100, 0, 100)
+        # Plots for each MPA
+        for idx_mpa, acc_mpa in enumerate(accs_mpa):
 
-            for shutter in range(0, no_shutters):
-                for mem in range(0, self._no_mems):
-                    if MPA.get_no_hits_shutter()[shutter][mem] != 0:
-                        h_mpa.Fill(MPA.get_no_hits_shutter()[shutter][mem])
+            # Histogram for one MPA
+            h_mpa = ROOT.TH1F(name % (idx_mpa), name % (idx_mpa), 100, 0, 100)
+            self._add_histo(h_mpa, acc_mpa)
 
             self._save_histo(h_mpa, '%s/%s.pdf' % (path, name % (idx_mpa)),
                              x_title, y_title, logy=True)
@@ -60,3 +59,15 @@ class BunchCrossing(Plotter):
 
         self._save_histo(stack, '%s/%s.pdf' % (path, name % ('all')),
                          x_title, y_title, leg, logy=True, draw_option='nostack')
+
+    def _fill_cts_bx(self, idx_mpa):
+
+        """ Return accumulator of the counts vs. bunch crossing of one MPA
+        (see _map_mpas()). """
+
+        # Fill in chunks of shutters, the data can be larger than memory
+        acc_mpa = Accumulator.from_axes([(100, 0, 100)])
+        for data in self._MPAs[idx_mpa].iter_chunks():
+            acc_mpa.fill(data[data != 0])
+
+        return acc_mpa
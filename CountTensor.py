@@ -0,0 +1,175 @@
+#!/usr/bin/env python2
+
+""" Author: Basil Schneider <basil.schneider@cern.ch>
+Counts of all MPAs, pixels and bunch crossings of a scan. """
+
+import numpy as np
+
+class CountTensor(object):
+
+    """ Number of hits of a scan over position and delay for all MPAs and
+    pixels, built log by log from the hits of the logs:
+
+      synchronous:  MPAs x pixels x BX's x positions x delays
+      asynchronous: MPAs x pixels x positions x delays
+
+    The axes are the MPA and pixel indices, the bunch crossings found in the
+    synchronous readout, and the different positions and delays of the logs.
+    Logs with the same position and delay are added up.
+
+    Per pixel plots are slices of the counts, e.g. the hits of pixel 22 of
+    MPA 4 in BX 9 versus position and delay are get_sync(4, 22, [9]). """
+
+    def __init__(self, hits_sync, hits_async, bxs, xs, delays):
+
+        """ Initialize instances from the count arrays and the values of the
+        axes, see from_logs(). """
+
+        self._hits_sync = hits_sync
+        self._hits_async = hits_async
+        self._bxs = np.asarray(bxs)
+        self._xs = np.asarray(xs)
+        self._delays = np.asarray(delays)
+
+    @classmethod
+    def from_logs(cls, logs):
+
+        """ Return counts of logs, an iterable of (position, delay, rows,
+        asynchronous hits) with the rows of the EventTable of one log and its
+        asynchronous hits (MPAs x pixels), e.g. from ScanLoader.load(). The
+        rows of each log are reduced to its counts before the next log is
+        taken, so the rows of the whole scan are never held in memory. """
+
+        xs_log, delays_log, hits_async, parts = [], [], [], []
+        for x, delay, rows, hits in logs:
+            hits = np.asarray(hits)
+            no_mpas, no_pxs = hits.shape
+
+            # Counts of the log (MPAs*pixels x BX's found in the log)
+            bxs_log, idx_bxs = np.unique(rows['bx'], return_inverse=True)
+            index = (rows['mpa'].astype(np.int64)*no_pxs + rows['px']) * \
+                len(bxs_log) + idx_bxs
+            counts = np.bincount(index,
+                                 minlength=no_mpas*no_pxs*len(bxs_log))
+            parts.append((bxs_log, counts.reshape(no_mpas*no_pxs,
+                                                  len(bxs_log))))
+
+            xs_log.append(x)
+            delays_log.append(delay)
+            hits_async.append(hits)
+
+        if not parts:
+            raise ValueError('Cannot count hits of a scan without logs.')
+
+        # Position and delay of each log as index of their axes
+        xs, idx_xs = np.unique(np.asarray(xs_log, dtype=np.float64),
+                               return_inverse=True)
+        delays, idx_delays = np.unique(np.asarray(delays_log,
+                                                  dtype=np.float64),
+                                       return_inverse=True)
+        idx_points = idx_xs*len(delays) + idx_delays
+        no_points = len(xs)*len(delays)
+
+        # Synchronous hits of logs with same position and delay are added up,
+        # the BX axis has the BX's of all logs
+        bxs = np.unique(np.concatenate([bxs_log for bxs_log, _ in parts]))
+        hits_sync = np.zeros((no_mpas*no_pxs, len(bxs), no_points),
+                             dtype=np.int64)
+        for idx_point, (bxs_log, counts) in zip(idx_points, parts):
+            hits_sync[:, np.searchsorted(bxs, bxs_log), idx_point] += counts
+        hits_sync = hits_sync.reshape(no_mpas, no_pxs, len(bxs), len(xs),
+                                      len(delays))
+
+        # Asynchronous hits of logs with same position and delay are added up
+        hits_points = np.zeros((no_points, no_mpas*no_pxs), dtype=np.int64)
+        np.add.at(hits_points, idx_points,
+                  np.array(hits_async).reshape(len(hits_async), -1))
+        hits_points = hits_points.T.reshape(no_mpas, no_pxs, len(xs),
+                                            len(delays))
+
+        return cls(hits_sync, hits_points, bxs, xs, delays)
+
+    @classmethod
+    def from_table(cls, table, xs_log, delays_log, hits_async):
+
+        """ Return counts of the rows of an EventTable. xs_log and delays_log
+        are the position and delay of each log, hits_async the asynchronous
+        hits of each log (logs x MPAs x pixels), see from_logs(). """
+
+        return cls.from_logs((x, delay, table[table['log'] == idx_log], hits)
+                             for idx_log, (x, delay, hits)
+                             in enumerate(zip(xs_log, delays_log,
+                                              hits_async)))
+
+    @classmethod
+    def load(cls, path):
+
+        """ Return counts saved with save(). """
+
+        data = np.load(path)
+
+        return cls(data['hits_sync'], data['hits_async'], data['bxs'],
+                   data['xs'], data['delays'])
+
+    def save(self, path):
+
+        """ Save counts to path (compressed numpy archive). """
+
+        np.savez_compressed(path, hits_sync=self._hits_sync,
+                            hits_async=self._hits_async, bxs=self._bxs,
+                            xs=self._xs, delays=self._delays)
+
+    def get_sync(self, mpas=None, pxs=None, bxs=None):
+
+        """ Return synchronous hits (positions x delays) summed over the
+        given MPAs, pixels and BX's (single values or lists, default all).
+        """
+
+        counts = self._hits_sync
+        if mpas is not None:
+            counts = counts[np.atleast_1d(mpas)]
+        if pxs is not None:
+            counts = counts[:, np.atleast_1d(pxs)]
+        if bxs is not None:
+            counts = counts[:, :, np.in1d(self._bxs, bxs)]
+
+        return counts.sum(axis=(0, 1, 2))
+
+    def get_sync_bx(self, mpas=None, pxs=None):
+
+        """ Return synchronous hits (BX's x positions x delays) summed over
+        the given MPAs and pixels (single values or lists, default all). """
+
+        counts = self._hits_sync
+        if mpas is not None:
+            counts = counts[np.atleast_1d(mpas)]
+        if pxs is not None:
+            counts = counts[:, np.atleast_1d(pxs)]
+
+        return counts.sum(axis=(0, 1))
+
+    def get_async(self, mpas=None, pxs=None):
+
+        """ Return asynchronous hits (positions x delays) summed over the
+        given MPAs and pixels (single values or lists, default all). """
+
+        counts = self._hits_async
+        if mpas is not None:
+            counts = counts[np.atleast_1d(mpas)]
+        if pxs is not None:
+            counts = counts[:, np.atleast_1d(pxs)]
+
+        return counts.sum(axis=(0, 1))
+
+    def get_bxs(self):
+
+        """ Return bunch crossings of the BX axis. """
+
+        return self._bxs
+
+    def get_grid(self):
+
+        """ Return positions and delays of all cells (positions x delays), to
+        fill the slices into histograms. """
+
+        return np.meshgrid(self._xs, self._delays, indexing='ij')
@@ -0,0 +1,88 @@
+#!/usr/bin/env python2
+
+""" Author: Basil Schneider <basil.schneider@cern.ch>
+Efficiencies of the MPA Light with binomial uncertainties.
+
+All functions work on arrays of any shape, e.g. scan points x MPAs x pixels.
+The Clopper-Pearson intervals are computed with scipy if it is available,
+otherwise with ROOT's TEfficiency. """
+
+import numpy as np
+
+# Confidence level of the intervals (one standard deviation)
+confidence_level = .682689492137
+
+def count_hits(table, no_points, no_mpas=6, no_pxs=48):
+
+    """ Return array (scan points x MPAs x pixels) of the number of hits in
+    the rows of an EventTable (columns log, mpa and px). """
+
+    index = (table['log'].astype(np.int64)*no_mpas +
+             table['mpa'])*no_pxs + table['px']
+
+    return np.bincount(index, minlength=no_points*no_mpas*no_pxs) \
+        .reshape(no_points, no_mpas, no_pxs)
+
+def get_efficiency(hits, n):
+
+    """ Return efficiencies hits/n. """
+
+    return np.asarray(hits, dtype=np.float64)/n
+
+def get_interval(hits, n, level=confidence_level):
+
+    """ Return lower and upper bounds of the Clopper-Pearson intervals of the
+    efficiencies hits/n. More hits than n are treated as n hits. """
+
+    n = int(n)
+    hits = np.clip(np.asarray(hits, dtype=np.int64), 0, n)
+
+    # The bounds only depend on the number of hits, compute them once for
+    # each different number
+    values, inverse = np.unique(hits, return_inverse=True)
+    lower, upper = _clopper_pearson(values, n, level)
+
+    return (lower[inverse].reshape(hits.shape),
+            upper[inverse].reshape(hits.shape))
+
+def get_variance(hits, n, level=confidence_level):
+
+    """ Return variances of the efficiencies hits/n, taken as the square of
+    half the width of the Clopper-Pearson intervals. """
+
+    lower, upper = get_interval(hits, n, level)
+
+    return ((upper - lower)/2.)**2
+
+def get_sync_above_async(hits_sync, hits_async):
+
+    """ Return boolean array, True where there are more hits in the
+    synchronous readout than in the asynchronous one, which is not physical.
+    """
+
+    return np.asarray(hits_sync) > np.asarray(hits_async)
+
+def _clopper_pearson(hits, n, level):
+
+    """ Return lower and upper bounds of the Clopper-Pearson intervals for
+    1d array of numbers of hits. """
+
+    alpha = 1. - level
+    try:
+        from scipy.stats import beta
+    except ImportError:
+        from LazyRoot import get_root
+        efficiency = get_root().TEfficiency
+        lower = np.array([efficiency.ClopperPearson(n, int(k), level, False)
+                          for k in hits])
+        upper = np.array([efficiency.ClopperPearson(n, int(k), level, True)
+                          for k in hits])
+        return lower, upper
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        lower = beta.ppf(alpha/2., hits, n - hits + 1)
+        upper = beta.ppf(1. - alpha/2., hits + 1, n - hits)
+    lower[hits == 0] = 0.
+    upper[hits == n] = 1.
+
+    return lower, upper
@@ -0,0 +1,77 @@
+#!/usr/bin/env python2
+
+""" Author: Basil Schneider <basil.schneider@cern.ch>
+Flat table of the hits of the MPA Light synchronous readout. """
+
+import numpy as np
+import HitMapDecoder
+
+class EventTable(object):
+
+    """ Table with one row per pixel hit of the synchronous readout, built by
+    joining the bunch crossing and hit map data of each log once. The columns
+    are log (index of log), x (position), delay, mpa, shutter, slot (memory
+    slot), bx (bunch crossing) and px (pixel in calibration geometry). The
+    rows are the pixels with hits of the events of SyncEvents.
+
+    Histograms are filled from selections of the table, e.g.
+    table['x'][(table['px'] == 22) & (table['bx'] == 9)]. """
+
+    dtype = np.dtype([('log', np.int32), ('x', np.float64),
+                      ('delay', np.float64), ('mpa', np.int8),
+                      ('shutter', np.int32), ('slot', np.int16),
+                      ('bx', np.int32), ('px', np.int8)])
+
+    def __init__(self):
+
+        """ Initialize instances. """
+
+        self._parts = []
+        self._table = None
+
+    def add_log(self, log, x, delay, events):
+
+        """ Add hits of one log. events is the SyncEvents object of the
+        log. """
+
+        self.add_rows(self.get_rows(log, x, delay, events))
+
+    def add_rows(self, rows):
+
+        """ Add rows (structured array with dtype of the table). """
+
+        self._parts.append(rows)
+        self._table = None
+
+    @classmethod
+    def get_rows(cls, log, x, delay, events):
+
+        """ Return rows of the hits of one log without adding them, see
+        add_log(). """
+
+        events = events.get_events()
+
+        # One row per pixel with hit
+        idx_events, pxs = np.nonzero(
+            HitMapDecoder.decode_pixels(events['hit_map']))
+
+        rows = np.zeros(len(pxs), dtype=cls.dtype)
+        rows['log'] = log
+        rows['x'] = x
+        rows['delay'] = delay
+        for field in ['mpa', 'shutter', 'slot', 'bx']:
+            rows[field] = events[field][idx_events]
+        rows['px'] = pxs
+
+        return rows
+
+    def get_table(self):
+
+        """ Return table as structured array. """
+
+        if self._table is None:
+            self._table = np.concatenate(self._parts + [np.zeros(0,
+                                                                 self.dtype)])
+            self._parts = [self._table]
+
+        return self._table
@@ -3,6 +3,8 @@
 """ Author: Basil Schneider <basil.schneider@cern.ch>
 Define 2d geometry of MPA devices. """
 
+import numpy as np
+
 class Geometry(object):
 
     def __init__(self):
@@ -13,6 +15,11 @@ class Geometry(object):
         self._bins_x = 0
         self._bins_y = 0
 
+        # Lookup tables numbering -> x and y axis coordinates, numberings which
+        # are not part of the geometry are set to NaN
+        self._x = np.zeros(0)
+        self._y = np.zeros(0)
+
     def set_geometry(self, geometry):
 
         """ Defines geometry, i.e. the following list is interpreted as a
@@ -34,20 +41,51 @@ class Geometry(object):
         # Get number of bins in y
         self._bins_y = len(geometry)
 
+        # Build lookup tables, if a numbering appears more than once, the
+        # first appearance counts
+        size = max([max(subgeometry) + 1 for subgeometry in geometry
+                    if len(subgeometry) > 0] + [0])
+        self._x = np.full(size, np.nan)
+        self._y = np.full(size, np.nan)
+        for idx, subgeometry in enumerate(geometry):
+            for idx_x, numbering in enumerate(subgeometry):
+                if np.isnan(self._x[numbering]):
+                    self._x[numbering] = idx_x + 0.5
+                    # Subtract idx from number of bins in y, since we start
+                    # counting from top; subtract 0.5 to hit bin center
+                    self._y[numbering] = self._bins_y - idx - 0.5
+
     def get_x(self, numbering):
 
         """ Return x axis coordinate in TH2F for numbering. """
 
-        for subgeometry in self._geometry:
-            if numbering in subgeometry:
-                return subgeometry.index(numbering) + 0.5
+        return self._lookup(self._x, numbering)
 
     def get_y(self, numbering):
 
         """ Return y axis coordinate in TH2F for numbering. """
 
-        for idx, subgeometry in enumerate(self._geometry):
-            if numbering in subgeometry:
-                # Subtract idx from number of bins in y, since we start
-                # counting from top; subtract 0.5 to hit bin center
-                return self._bins_y - idx - 0.5
+        return self._lookup(self._y, numbering)
+
+    def get_xy(self, numberings):
+
+        """ Return arrays of x and y axis coordinates in TH2F for array of
+        numberings. Numberings which are not part of the geometry get NaN. """
+
+        numberings = np.asarray(numberings, dtype=np.int64)
+        valid = (numberings >= 0) & (numberings < len(self._x))
+        x = np.full(numberings.shape, np.nan)
+        y = np.full(numberings.shape, np.nan)
+        x[valid] = self._x[numberings[valid]]
+        y[valid] = self._y[numberings[valid]]
+
+        return x, y
+
+    def _lookup(self, table, numbering):
+
+        """ Return entry of lookup table for numbering, or None if numbering is
+        not part of the geometry. """
+
+        if 0 <= numbering < len(table) and not np.isnan(table[numbering]):
+            return float(table[numbering])
+        return None
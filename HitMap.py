@@ -5,9 +5,11 @@ Simple plotting script to visualize the output of the MPA Light synchronous
 readout (hit map data). """
 
 from os import system
-from ROOT import TH2F, TCanvas
 from Plotter import Plotter
-from Geometry import Geometry
+from LazyRoot import get_root
+from Accumulator import Accumulator
+from Profiler import Profiler
+from Renderer import Renderer
 
 class HitMap(Plotter):
 
@@ -18,7 +20,7 @@ class HitMap(Plotter):
 
         """ Initialize class instances. """
 
-        self._initialize_mpas(self._no_mems)
+        self._initialize_mpas(self._no_mems, hit_map=True)
 
     def plot_maps(self, path):
 
@@ -27,11 +29,9 @@ class HitMap(Plotter):
         system('mkdir -p %s' % path)
         name = 'hit_maps_MPA%s'
 
-        # Get number of shutters
-        no_shutters = len(self._MPAs[0].get_no_hits_shutter())
-
         # Histogram for all pixels and all MPA's
         map_merged = self._create_map(name % 'merged')
+        acc_merged = Accumulator(map_merged)
 
         # List to store map objects for later plotting
         maps = []
@@ -39,33 +39,18 @@ class HitMap(Plotter):
         # Find maximum Z for adjusting Z range later
         z_max = 0
 
-        # Plots for each pixel and each MPA
-        for idx_mpa, MPA in enumerate(self._MPAs):
+        # Maps of each MPA, decoding the hit maps is done in parallel with
+        # jobs > 1
+        accs_mpa = self._map_mpas('_fill_map')
 
-            # Define layout of MPA chip (this layout is different from the
-            # ripple counter layout, since the data is stored in a different
-            # way (empirical observation))
-            geometry = Geometry()
-            if idx_mpa in [0, 1, 2]:
-                geometry.set_geometry([range(32, 48), range(16, 32),
-                                       range(0, 16)])
-            else:
-                geometry.set_geometry([range(15, -1, -1), range(31, 15, -1),
-                                       range(47, 31, -1)])
+        # Plots for each MPA
+        for idx_mpa, acc_mpa in enumerate(accs_mpa):
 
             # Histogram for all pixels on one MPA
             map_mpa = self._create_map(name % idx_mpa)
 
-            for i_hit_maps in MPA.get_no_hits_shutter():
-                for i_hit_map in i_hit_maps:
-
-                    s_hit_map = str(i_hit_map).zfill(self._no_pxs_x*self._no_pxs_y)
-
-                    for px, px_hits in enumerate(s_hit_map):
-                        map_mpa.Fill(geometry.get_x(px), geometry.get_y(px),
-                                     float(px_hits))
-                        map_merged.Fill(geometry.get_x(px), geometry.get_y(px),
-                                        float(px_hits))
+            self._add_histo(map_mpa, acc_mpa)
+            acc_merged.add(acc_mpa)
 
             # For the map showing all MPA's we want the Z range to be the same
             # Find maximum here
@@ -76,17 +61,45 @@ class HitMap(Plotter):
                              '%s/%s.pdf' % (path, name % (idx_mpa)),
                              draw_option='COLZ|TEXT90')
 
+        acc_merged.flush()
         self._save_histo(map_merged,
                          '%s/%s.pdf' % (path, name % ('merged')),
                          draw_option='COLZ|TEXT90')
 
-        self._plot_map_all(maps, path, name, z_max)
+        with Profiler.stage('render'):
+            self._plot_map_all(maps, path, name, z_max)
+
+    def _fill_map(self, idx_mpa):
+
+        """ Return accumulator of the 2d hit map of one MPA (see
+        _map_mpas()). """
+
+        # Coordinates of all pixels in map
+        x, y = self._get_geometry(idx_mpa).get_xy(
+            range(0, self._no_pxs_x*self._no_pxs_y))
+
+        # Number of hits per pixel of the hit map, the pixels are counted from
+        # the beginning of the hit map (like in the zero padded string of the
+        # hit map)
+        px_hits = self._MPAs[idx_mpa].get_pixel_hits()[::-1]
+
+        # Every hit has weight 1, so the sum of squared weights is the number
+        # of hits as well
+        return Accumulator.from_axes(self._get_map_axes()) \
+            .fill(x, y, px_hits, px_hits)
 
     def _plot_map_all(self, maps, path, name, z_max):
 
         """ Plot all maps in one TCanvas. """
 
-        canvas = TCanvas()
+        path_all = '%s/%s.pdf' % (path, name % ('all'))
+        if Renderer.is_unchanged(path_all, maps, {'z_max': z_max}):
+            return
+
+        ROOT = get_root()
+
+        canvas = ROOT.TCanvas()
+        Profiler.count('canvases')
         canvas.Divide(3, 2)
 
         for idx, map in enumerate(maps):
@@ -102,15 +115,27 @@ class HitMap(Plotter):
             map.SetMarkerSize(1.7)
             map.Draw(drawing_option)
 
-        canvas.SaveAs('%s/%s.pdf' % (path, name % ('all')))
+        canvas.SaveAs(path_all)
+
+    def _get_layout(self, idx_mpa):
+
+        """ Return layout of MPA chip (this layout is different from the
+        ripple counter layout, since the data is stored in a different way
+        (empirical observation)). """
+
+        if idx_mpa in [0, 1, 2]:
+            return [range(32, 48), range(16, 32), range(0, 16)]
+        return [range(15, -1, -1), range(31, 15, -1), range(47, 31, -1)]
 
     def _create_map(self, name):
 
         """ Create and return TH2F map. """
 
-        map = TH2F(name, name,
-                   self._no_pxs_x, 0, self._no_pxs_x,
-                   self._no_pxs_y, 0, self._no_pxs_y)
+        ROOT = get_root()
+
+        map = ROOT.TH2F(name, name,
+                        self._no_pxs_x, 0, self._no_pxs_x,
+                        self._no_pxs_y, 0, self._no_pxs_y)
 
         # Set number of ticks on x and y axes
         map.GetXaxis().SetNdivisions(self._no_pxs_x, 0, 0)
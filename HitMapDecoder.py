@@ -0,0 +1,125 @@
+#!/usr/bin/env python2
+
+""" Author: Basil Schneider <basil.schneider@cern.ch>
+Decode hit maps of the MPA Light synchronous readout.
+
+A hit map is written as a number made of up to 48 digits 0 and 1, the last
+digit being pixel 0 of the hit map. Internally, hit maps are stored as 64 bit
+words, where the last digit of the hit map is the lowest bit. """
+
+import numpy as np
+
+# Number of pixels in one hit map
+no_pxs = 48
+
+# Bit positions of the pixels in a hit map word
+_bits = np.arange(no_pxs, dtype=np.int64)
+
+# Geometries of hit map and calibration differ, calibration[px] is the pixel
+# number in the calibration for pixel px of the hit map
+calibration = np.array([px if px in range(16, 32) else 47 - px
+                        for px in range(0, no_pxs)])
+
+# Inverse of calibration, i.e. _calibration_inv[calibration[px]] == px
+_calibration_inv = np.argsort(calibration)
+
+# Number of words to decode at once, limits memory of temporary arrays
+_chunk_size = 1 << 16
+
+def pack(tokens):
+
+    """ Convert hit maps (strings or numbers made of 0's and 1's) to array of
+    words. Lists of strings (e.g. the tokens of a logfile) are converted in
+    chunks of _chunk_size, so only the words of the whole list are held in
+    memory. """
+
+    if isinstance(tokens, list) and tokens and \
+       isinstance(tokens[0], basestring):
+        shape = (len(tokens),)
+    else:
+        tokens = np.asarray(tokens, dtype='S%s' % (no_pxs+1))
+        shape = tokens.shape
+        tokens = tokens.reshape(-1)
+
+    words = np.empty(len(tokens), dtype=np.int64)
+    for start in range(0, len(tokens), _chunk_size):
+        words[start:start+_chunk_size] = \
+            _pack_chunk(tokens[start:start+_chunk_size])
+
+    return words.reshape(shape)
+
+def _pack_chunk(tokens):
+
+    """ Convert chunk of hit maps to array of words, see pack(). """
+
+    # Fixed width strings with one more character than allowed, so too long
+    # hit maps can be detected
+    tokens = np.ascontiguousarray(tokens, dtype='S%s' % (no_pxs+1))
+
+    # One character per column, strings are padded with '\0' on the right
+    chars = tokens.view(np.uint8).reshape(-1, no_pxs+1)
+    if chars[:, no_pxs].any():
+        raise ValueError('Hit map with more than %s digits found.' % no_pxs)
+    chars = chars[:, :no_pxs]
+    if not np.all((chars == ord('0')) | (chars == ord('1')) | (chars == 0)):
+        raise ValueError('Hit map with digits other than 0 and 1 found.')
+
+    # Digits as bits of big endian 64 bit words, the first digit of each
+    # string being bit 47
+    bytes_words = np.zeros((len(chars), 8), dtype=np.uint8)
+    bytes_words[:, 8-no_pxs//8:] = np.packbits(chars == ord('1'), axis=1)
+    words = bytes_words.view('>u8').reshape(-1).astype(np.int64)
+
+    # The last digit of each string is the lowest bit
+    lengths = (chars != 0).sum(axis=1)
+
+    return words >> (no_pxs - lengths)
+
+def unpack(words):
+
+    """ Convert array of words to list of hit maps (numbers made of 0's and
+    1's). """
+
+    return [int(bin(word)[2:]) for word in np.asarray(words).tolist()]
+
+def decode_mask(words):
+
+    """ Return boolean pixel mask of shape words.shape + (48,). Index px of the
+    last axis is pixel px of the hit map, i.e. digit px counted from the end of
+    the hit map. """
+
+    words = np.asarray(words, dtype=np.int64)
+    return ((words[..., np.newaxis] >> _bits) & 1).astype(bool)
+
+def decode_pixels(words):
+
+    """ Return boolean pixel mask of shape words.shape + (48,). Index px of the
+    last axis is pixel px of the calibration. """
+
+    return decode_mask(words)[..., _calibration_inv]
+
+def pixel_lists(words):
+
+    """ Return list of pixels (in calibration geometry) with hits for each
+    word in 1d array words. """
+
+    words = np.asarray(words, dtype=np.int64)
+    rows, pxs = np.nonzero(decode_mask(words))
+    pxs = calibration[pxs]
+    bounds = np.cumsum(np.bincount(rows, minlength=len(words)))[:-1]
+
+    return [pxs_word.tolist() for pxs_word in np.split(pxs, bounds)]
+
+def count_pixels(words):
+
+    """ Return number of hits per pixel of the hit map (array of length 48),
+    summed over all words. """
+
+    words = np.asarray(words, dtype=np.int64).reshape(-1)
+    words = words[words != 0]
+
+    counts = np.zeros(no_pxs, dtype=np.int64)
+    for start in range(0, len(words), _chunk_size):
+        counts += decode_mask(words[start:start+_chunk_size]).sum(axis=0)
+
+    return counts
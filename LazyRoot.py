@@ -0,0 +1,24 @@
+#!/usr/bin/env python2
+
+""" Author: Basil Schneider <basil.schneider@cern.ch>
+Load ROOT only when it is needed. """
+
+_root = None
+
+def get_root():
+
+    """ Return the ROOT module. It is imported on the first call, which takes
+    a few seconds, and set to batch mode without statistics in plots. Parsing
+    and decoding the logfiles does not need ROOT, only drawing does. """
+
+    global _root
+
+    if _root is None:
+        import ROOT
+        # ROOT batch mode
+        ROOT.gROOT.SetBatch(True)
+        # No statistics in plots
+        ROOT.gStyle.SetOptStat(0)
+        _root = ROOT
+
+    return _root
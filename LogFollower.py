@@ -0,0 +1,64 @@
+#!/usr/bin/env python2
+
+""" Author: Basil Schneider <basil.schneider@cern.ch>
+Follow raw logfiles while they are written by the DAQ. """
+
+from os.path import getsize, isfile
+
+class LogFollower(object):
+
+    """ Follow a raw logfile which is still being written and add its new
+    lines to the MPA objects of a Plotter object. Only complete lines are
+    parsed; the remainder of a partially written line is kept for the next
+    update. The number of lines read so far is kept, so the lines keep being
+    assigned to the correct MPA object across updates. """
+
+    def __init__(self, plotter, logfile):
+
+        """ Initialize instances. """
+
+        self._plotter = plotter
+        self._logfile = logfile
+
+        # Position in logfile up to which it has been read
+        self._offset = 0
+        # Number of complete lines added to the MPA objects
+        self._no_lines = 0
+        # Partially written line
+        self._rest = ''
+
+    def update(self):
+
+        """ Add lines written since the last update to the MPA objects and
+        return their number. """
+
+        if not isfile(self._logfile):
+            return 0
+
+        if getsize(self._logfile) < self._offset:
+            raise IOError('The logfile %s got shorter while following it.'
+                          % self._logfile)
+
+        with open(self._logfile, 'r') as f_log:
+            f_log.seek(self._offset)
+            raw = f_log.read()
+        self._offset += len(raw)
+
+        # Only parse complete lines
+        raw = self._rest + raw
+        end = raw.rfind('\n') + 1
+        self._rest = raw[end:]
+        if end == 0:
+            return 0
+
+        no_lines = self._plotter.read_lines_raw(raw[:end], self._no_lines,
+                                                self._logfile)
+        self._no_lines += no_lines
+
+        return no_lines
+
+    def get_no_lines(self):
+
+        """ Return number of lines added to the MPA objects. """
+
+        return self._no_lines
@@ -4,19 +4,48 @@
 MPA data class to store MPA specific quantitites. """
 
 from itertools import izip
+from os import environ
+from tempfile import TemporaryFile
+import numpy as np
+import HitMapDecoder
 
 class MPA(object):
 
     """ MPA data class to store MPA specific qantitities. The data is stored in
-    _no_hits_shutter. This is a list of list with the following structure:
+    _data. This is a 2d array with one row per shutter and one column per
+    element:
     [[a,b,...], [c,d], ...] - a is the no. of hits on pixel 1 during shutter 1
                               b is the no. of hits on pixel 2 during shutter 1
                               c is the no. of hits on pixel 1 during shutter 2
                               d is the no. of hits on pixel 2 during shutter 2
                               ...
-    """
 
-    def __init__(self, no_elements):
+    Hit maps are written as 48 digit numbers made of 0's and 1's, which do not
+    fit into a 64 bit integer. For MPA objects holding hit maps (hit_map=True)
+    the digits are therefore stored as bits, i.e. the last digit of the hit map
+    becomes the lowest bit of the stored word (see HitMapDecoder).
+
+    The list of list structure of the original implementation is still
+    available through get_no_hits_shutter(). After trim_no_hits_shutter() or
+    convert_hm_to_px() the data is no longer rectangular and only the list of
+    list structure is kept.
+
+    With MPA.storage_dir set (default from the environment variable
+    MPA_OUT_OF_CORE), _data is a memory-mapped temporary file in that
+    directory instead of an array in memory, so runs with more shutters than
+    fit into memory can be stored. Reductions over the shutters are done in
+    chunks of _chunk_shutters shutters, see iter_chunks(). """
+
+    # Directory for memory-mapped data, None to keep data in memory
+    storage_dir = environ.get('MPA_OUT_OF_CORE') or None
+
+    # Number of shutters to allocate memory for in the beginning
+    _initial_capacity = 64
+
+    # Number of shutters per chunk of reductions
+    _chunk_shutters = 1 << 16
+
+    def __init__(self, no_elements, hit_map=False):
 
         """ Initialize instances. """
 
@@ -25,19 +54,127 @@ class MPA(object):
         # number of words for synchronous readout
         self.no_elements = no_elements
 
-        # Number of hits per shutter
-        self._no_hits_shutter = []
+        # Hit maps are stored bit packed
+        self.hit_map = hit_map
+
+        # Number of hits per shutter, only the first _no_shutters rows are
+        # filled, the rest is preallocated memory (or file)
+        self._file = None
+        if self.storage_dir is not None:
+            # The file is deleted when it is closed
+            self._file = TemporaryFile(prefix='mpa_', suffix='.dat',
+                                       dir=self.storage_dir)
+        self._data = self._allocate(self._initial_capacity)
+        self._no_shutters = 0
+
+        # List of list representation of the data, built on request
+        self._no_hits_shutter = None
+
+        # Running totals: number of hits per element summed over all shutters
+        # and highest value, updated whenever shutters are added. Not kept for
+        # hit maps, whose bit packed words are no numbers of hits; their
+        # totals are computed from the unpacked hit maps on request
+        self._totals = None if hit_map else np.zeros(no_elements,
+                                                     dtype=np.int64)
+        self._max = 0
+        self._no_hits = None
+
+        # Running number of hits per pixel of the hit map (only for hit maps)
+        self._pixel_hits = np.zeros(HitMapDecoder.no_pxs, dtype=np.int64)
+
+        # Values different from 0 and their number per shutter, only set
+        # after trim_no_hits_shutter()
+        self._words = None
+        self._words_per_shutter = None
 
     def set_no_hits_shutter(self, no_hits):
 
         """ Set number of hits per shutter. """
 
         self.check_if_list(no_hits, self.no_elements, self.no_elements)
-        self._no_hits_shutter.append(no_hits)
+        if self.hit_map:
+            no_hits = HitMapDecoder.pack(no_hits)
+        self._reserve(self._no_shutters + 1)
+        self._data[self._no_shutters] = no_hits
+        self._no_shutters += 1
+        self._update_totals(self._data[self._no_shutters-1:self._no_shutters])
+
+    def add_no_hits_shutters(self, no_hits):
+
+        """ Set number of hits for several shutters at once. no_hits is a 2d
+        array (shutters x elements), hit maps have to be passed as bits
+        already. """
+
+        no_hits = np.asarray(no_hits, dtype=np.int64)
+        if no_hits.ndim != 2 or no_hits.shape[1] != self.no_elements:
+            raise TypeError('The array of shape %s does not meet the '
+                            'requirement of %s elements per shutter.'
+                            % (no_hits.shape, self.no_elements))
+
+        self._reserve(self._no_shutters + len(no_hits))
+        self._data[self._no_shutters:self._no_shutters+len(no_hits)] = no_hits
+        self._no_shutters += len(no_hits)
+        self._update_totals(no_hits)
+
+    def get_data(self):
+
+        """ Get number of hits per shutter as read-only 2d array (shutters x
+        elements). """
+
+        if self._data is None:
+            raise ValueError('Data has been trimmed or converted and is no '
+                             'longer available as array.')
+
+        data = self._data[:self._no_shutters]
+        data.flags.writeable = False
+        return data
+
+    def iter_chunks(self):
+
+        """ Return generator of consecutive chunks of (read-only) data, each
+        with at most _chunk_shutters shutters. """
+
+        data = self.get_data()
+        for start in range(0, len(data), self._chunk_shutters):
+            yield data[start:start+self._chunk_shutters]
+
+    def get_shutter_sums(self):
+
+        """ Get array of number of hits per shutter, summed over all
+        elements. """
+
+        sums = np.zeros(self.get_no_shutters(), dtype=np.int64)
+        start = 0
+        for chunk in self.iter_chunks():
+            sums[start:start+len(chunk)] = chunk.sum(axis=1)
+            start += len(chunk)
+
+        return sums
+
+    def get_no_shutters(self):
+
+        """ Get number of shutters. """
+
+        if self._data is None:
+            return len(self.get_no_hits_shutter())
+        return self._no_shutters
 
     def get_no_hits_shutter(self):
 
-        """ Get number of hits per shutter. """
+        """ Get number of hits per shutter as list of lists. """
+
+        if self._no_hits_shutter is None:
+            if self._data is not None:
+                words = self.get_data().reshape(-1)
+                words_per_shutter = [self.no_elements]*self._no_shutters
+            else:
+                words = self._words
+                words_per_shutter = self._words_per_shutter
+            if self.hit_map:
+                values = HitMapDecoder.unpack(words)
+            else:
+                values = words.tolist()
+            self._no_hits_shutter = self._split(values, words_per_shutter)
 
         return self._no_hits_shutter
 
@@ -45,56 +182,147 @@ class MPA(object):
 
         """ Remove all 0's in hits per shutter data. """
 
-        # Get rid of all 0's in the sublists
-        self._no_hits_shutter = [[val for val in sublist if val != 0]
-                                 for sublist in self.get_no_hits_shutter()]
-        # Get rid of all empty sublists
-        self._no_hits_shutter = [sublist for sublist
-                                 in self.get_no_hits_shutter()
-                                 if len(sublist) > 0]
+        if self._data is None:
+            # Data has been trimmed or converted before, only the lists are
+            # left
+            no_hits_shutter = [[val for val in sublist if val != 0]
+                               for sublist in self.get_no_hits_shutter()]
+            self._no_hits_shutter = [sublist for sublist in no_hits_shutter
+                                     if len(sublist) > 0]
+            return
+
+        # Keep all values different from 0 (shutter by shutter) and the number
+        # of values kept per shutter, shutters without values are dropped
+        data = self.get_data()
+        nonzero = data != 0
+        self._words = data[nonzero]
+        self._words_per_shutter = nonzero.sum(axis=1)
+        self._words_per_shutter = \
+            self._words_per_shutter[self._words_per_shutter > 0].tolist()
+
+        self._no_hits_shutter = None
+        self._data = None
+        self._file = None
+        self._totals = None
+        self._pixel_hits = None
 
     def convert_hm_to_px(self):
 
         """ Convert hit maps to list of pixels with hits. """
 
-        MPA_ph = []
-        for hit_map_list in self._no_hits_shutter:
-            MPA_ph_shutter = []
-            for hit_map in hit_map_list:
-                MPA_ph_shutter_bx = []
-                # Reverse loop through hit map digit by digit
-                for idx, px in enumerate(str(hit_map)[::-1]):
-                    if px == '1':
-                        MPA_ph_shutter_bx.append(self._get_coordinate(idx))
-                MPA_ph_shutter.append(MPA_ph_shutter_bx)
-            MPA_ph.append(MPA_ph_shutter)
+        if self._data is not None:
+            words = self.get_data().reshape(-1)
+            words_per_shutter = [self.no_elements]*self._no_shutters
+        elif self._words is not None:
+            words = self._words
+            words_per_shutter = self._words_per_shutter
+        else:
+            raise ValueError('Hit maps have been converted already.')
 
-        self._no_hits_shutter = MPA_ph
+        pixels = HitMapDecoder.pixel_lists(words)
+        self._no_hits_shutter = self._split(pixels, words_per_shutter)
+        self._data = None
+        self._file = None
+        self._words = None
+        self._totals = None
+        self._pixel_hits = None
 
-    def _get_coordinate(self, px):
+    def _split(self, values, lengths):
 
-        """ Get coordinate of pixel, since geometries of hit map and
-        calibration differ. """
+        """ Split list values into sublists of given lengths. """
 
-        if px in range(16, 32):
-            return px
-        return (47 - px)
+        sublists = []
+        start = 0
+        for length in lengths:
+            sublists.append(values[start:start+length])
+            start += length
+
+        return sublists
 
     def get_no_hits(self):
 
-        """ Get number of hits, integrated over all shutters. """
+        """ Get number of hits, integrated over all shutters. The returned
+        list is shared between calls and must not be modified. For hit maps,
+        the unpacked hit maps are added up (see get_pixel_hits() for the hits
+        per pixel). """
+
+        if self._totals is None:
+            return [sum(sublist) for sublist
+                    in izip(*self.get_no_hits_shutter())]
 
-        return [sum(sublist) for sublist in izip(*self.get_no_hits_shutter())]
+        if self._no_hits is None:
+            self._no_hits = self._totals.tolist()
+        return self._no_hits
 
     def get_max(self):
 
         """ Get highest value in self._no_hits_shutter. """
 
-        max_value = 0
-        for element in self._no_hits_shutter:
-            max_value = max(max_value, max(element))
+        if self._totals is None:
+            max_value = 0
+            for element in self.get_no_hits_shutter():
+                max_value = max(max_value, max(element))
+            return max_value
+
+        return self._max
+
+    def get_pixel_hits(self):
+
+        """ Get number of hits per pixel of the hit map (index px is digit px
+        counted from the end of the hit map), integrated over all shutters.
+        Only available for hit maps. """
+
+        if not self.hit_map or self._pixel_hits is None:
+            raise ValueError('Number of hits per pixel is only available for '
+                             'hit maps which are not trimmed or converted.')
+
+        return self._pixel_hits
+
+    def _update_totals(self, no_hits):
+
+        """ Update running totals with newly added shutters and invalidate
+        representations derived from the data. """
+
+        if len(no_hits) > 0:
+            if self.hit_map:
+                self._pixel_hits += HitMapDecoder.count_pixels(no_hits)
+            else:
+                self._totals += no_hits.sum(axis=0)
+                self._max = max(self._max, int(no_hits.max()))
+        self._no_hits = None
+        self._no_hits_shutter = None
+
+    def _reserve(self, no_shutters):
+
+        """ Make sure memory for no_shutters shutters is allocated. The
+        capacity is doubled when needed, so appending is amortised O(1). """
+
+        capacity = len(self._data)
+        if no_shutters <= capacity:
+            return
+
+        while capacity < no_shutters:
+            capacity *= 2
+        if self._file is not None:
+            # The file keeps the data, it only has to be mapped again
+            self._data = self._allocate(capacity)
+            return
+        data = self._allocate(capacity)
+        data[:self._no_shutters] = self._data[:self._no_shutters]
+        self._data = data
+
+    def _allocate(self, capacity):
+
+        """ Return array for capacity shutters, mapped to _file if it is set.
+        """
+
+        if self._file is None:
+            return np.zeros((capacity, self.no_elements), dtype=np.int64)
 
-        return max_value
+        # Growing the file keeps its content, new parts read as 0's
+        self._file.truncate(capacity*self.no_elements*8)
+        return np.memmap(self._file, dtype=np.int64, mode='r+',
+                         shape=(capacity, self.no_elements))
 
     def check_if_list(self, lst, length_min=-1, length_max=-1):
 
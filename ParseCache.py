@@ -0,0 +1,207 @@
+#!/usr/bin/env python2
+
+""" Author: Basil Schneider <basil.schneider@cern.ch>
+Binary cache of parsed raw logfiles. """
+
+import json
+from argparse import ArgumentParser
+from glob import glob
+from hashlib import sha1
+from os import environ, getpid, listdir, makedirs, remove, rename, stat
+from os.path import abspath, basename, dirname, isdir, isfile, join
+from time import time
+import numpy as np
+
+class ParseCache(object):
+
+    """ Cache for parsed raw logfiles. The cache lives in a directory
+    .parse_cache next to the logfiles. Each parsed logfile is stored as .npy
+    file (which can be memory mapped) together with a small .json file
+    describing the source. Entries are keyed by the path, size and
+    modification time of the logfile and by the cache format version, so a
+    changed logfile never hits an old entry. Counts are stored in the
+    narrowest unsigned integer type holding their maximum, only hit maps need
+    64 bit words.
+
+    Caching can be switched off by setting the environment variable
+    MPA_PARSE_CACHE=0 or by setting ParseCache.enabled to False. """
+
+    # Increase whenever the format of the stored arrays changes
+    _version = 2
+
+    _dir_name = '.parse_cache'
+
+    enabled = environ.get('MPA_PARSE_CACHE', '1') != '0'
+
+    def __init__(self, logfile):
+
+        """ Initialize instances for one raw logfile. """
+
+        self._logfile = abspath(logfile)
+        self._directory = join(dirname(self._logfile), self._dir_name)
+
+    def load(self, no_elements, hit_map):
+
+        """ Return cached array of logfile (memory mapped, read-only), or None
+        if there is no valid entry. """
+
+        try:
+            path = self._get_path(no_elements, hit_map)
+            return np.load('%s.npy' % path, mmap_mode='r')
+        except (IOError, OSError, ValueError):
+            return None
+
+    def get_state(self):
+
+        """ Return size and modification time of logfile. The state has to
+        be taken before the logfile is read and passed to store(), so lines
+        written while the logfile is parsed do not end up in an entry of the
+        grown logfile. """
+
+        f_stat = stat(self._logfile)
+        return f_stat.st_size, f_stat.st_mtime
+
+    def store(self, data, no_elements, hit_map, state):
+
+        """ Store array of logfile, read in the given state (see get_state()),
+        in cache. Older entries of the same logfile are removed. Failures
+        (e.g. read-only file systems) are ignored. """
+
+        try:
+            path = self._get_path(no_elements, hit_map, state)
+            if not isdir(self._directory):
+                makedirs(self._directory)
+
+            # Remove entries of older versions of this logfile
+            for old in glob('%s.*.json' % self._get_prefix(no_elements,
+                                                           hit_map)):
+                self._remove_entry(old[:-len('.json')])
+
+            # Write to temporary files first, so that concurrent readers
+            # never see half written entries
+            tmp = '%s.%s.tmp' % (path, getpid())
+            with open(tmp, 'wb') as f_tmp:
+                np.save(f_tmp, np.ascontiguousarray(data,
+                                                    self._get_dtype(data,
+                                                                    hit_map)))
+            with open('%s.json' % tmp, 'w') as f_tmp:
+                json.dump(self._get_metadata(state), f_tmp)
+            rename(tmp, '%s.npy' % path)
+            rename('%s.json' % tmp, '%s.json' % path)
+        except (IOError, OSError):
+            pass
+
+    @staticmethod
+    def _get_dtype(data, hit_map):
+
+        """ Return type data is stored as. """
+
+        if hit_map or data.size == 0 or data.min() < 0:
+            return np.int64
+        return np.min_scalar_type(data.max())
+
+    def _get_metadata(self, state):
+
+        """ Return description of logfile in state and cache format. """
+
+        size, mtime = state
+        return {'source': self._logfile,
+                'size': size,
+                'mtime': mtime,
+                'version': self._version,
+                'created': time()}
+
+    def _get_prefix(self, no_elements, hit_map):
+
+        """ Return path of cache entries without fingerprint. """
+
+        return join(self._directory, '%s.%s%s' % (basename(self._logfile),
+                                                  'hm' if hit_map else '',
+                                                  no_elements))
+
+    def _get_path(self, no_elements, hit_map, state=None):
+
+        """ Return path of cache entry (without extension) for state of
+        logfile (see get_state(), default the current state). """
+
+        size, mtime = state or self.get_state()
+        fingerprint = sha1('%s|%s|%r|%s' % (self._logfile, size, mtime,
+                                            self._version))
+        return '%s.%s' % (self._get_prefix(no_elements, hit_map),
+                          fingerprint.hexdigest()[:16])
+
+    @staticmethod
+    def _remove_entry(path):
+
+        """ Remove .npy and .json file of cache entry. """
+
+        for extension in ['.npy', '.json']:
+            ParseCache._remove(path + extension)
+
+    @staticmethod
+    def _remove(path):
+
+        """ Remove file, ignore files which are already gone. """
+
+        try:
+            remove(path)
+        except OSError:
+            pass
+
+    @classmethod
+    def prune(cls, directory, max_age=None):
+
+        """ Remove outdated entries from cache of directory (entries of
+        logfiles which changed or do not exist anymore, entries of other
+        format versions, entries older than max_age days, and leftover
+        temporary files). Return number of removed entries. """
+
+        directory = join(directory, cls._dir_name)
+        if not isdir(directory):
+            return 0
+
+        removed = 0
+        for name in listdir(directory):
+            path = join(directory, name)
+            # Leftover temporary files and arrays without description
+            if (name.endswith('.tmp') or name.endswith('.tmp.json') or
+                    (name.endswith('.npy') and
+                     not isfile('%s.json' % path[:-len('.npy')]))):
+                cls._remove(path)
+                continue
+            if not name.endswith('.json'):
+                continue
+            path = path[:-len('.json')]
+            try:
+                with open('%s.json' % path, 'r') as f_meta:
+                    meta = json.load(f_meta)
+                f_stat = stat(meta['source'])
+                outdated = (meta['version'] != cls._version or
+                            meta['size'] != f_stat.st_size or
+                            meta['mtime'] != f_stat.st_mtime or
+                            (max_age is not None and
+                             time() - meta['created'] > max_age*86400.))
+            except (IOError, OSError, ValueError, KeyError):
+                outdated = True
+            if outdated:
+                cls._remove_entry(path)
+                removed += 1
+
+        return removed
+
+if __name__ == '__main__':
+
+    parser = ArgumentParser(description='Manage the cache of parsed raw '
+                            'logfiles.')
+    parser.add_argument('command', choices=['prune'])
+    parser.add_argument('directories', nargs='+',
+                        help='directories containing the raw logfiles')
+    parser.add_argument('--max-age', type=float, default=None,
+                        help='also remove entries older than this number of '
+                        'days')
+    args = parser.parse_args()
+
+    for directory in args.directories:
+        print '%s: removed %s entries' % (directory,
+                                          ParseCache.prune(directory,
+                                                           args.max_age))
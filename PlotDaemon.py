@@ -0,0 +1,339 @@
+#!/usr/bin/env python2
+
+""" Author: Basil Schneider <basil.schneider@cern.ch>
+Long-lived service producing the plots of DAQ directories. """
+
+import json
+import socket
+import traceback
+from argparse import ArgumentParser
+from multiprocessing import Pool
+from multiprocessing.queues import SimpleQueue
+from os import chmod, environ, getpid, kill, remove
+from os.path import exists, isabs
+from SocketServer import StreamRequestHandler, ThreadingMixIn, UnixStreamServer
+from threading import Lock, Thread
+from time import time
+
+# Default path of the socket
+socket_path = environ.get('MPA_DAEMON', '/tmp/mpa_plot_daemon.sock')
+
+# Queue of the worker process, to report (job id, process id) of the jobs
+# it starts
+_started = None
+
+def _initialize_worker(started):
+
+    """ Load ROOT and the plotting classes in worker process, so jobs only
+    do the work on the data. started is the queue to report the jobs
+    started. """
+
+    global _started
+    _started = started
+
+    # Importing plot imports the plotting classes
+    import plot
+    from LazyRoot import get_root
+    import Settings
+    # Histograms of different jobs have the same names
+    get_root().TH1.AddDirectory(False)
+    # Worker processes cannot have worker processes of their own
+    Settings.set_jobs(1)
+
+def _run_job(id, path_logs, only, skip, force):
+
+    """ Produce plots of one DAQ directory (runs in worker process). Return
+    (True, (families produced, families up to date)) or (False, traceback).
+    """
+
+    _started.put((id, getpid()))
+
+    import plot
+    try:
+        return True, plot.plot_directory(path_logs, only, skip, force)
+    # Also e.g. SystemExit from invalid plot families
+    except BaseException:
+        return False, traceback.format_exc()
+
+def _is_alive(pid):
+
+    """ Return True if process pid exists. """
+
+    try:
+        kill(pid, 0)
+    except OSError:
+        return False
+
+    return True
+
+class _Server(ThreadingMixIn, UnixStreamServer):
+
+    """ Server handling each connection in a thread. """
+
+    daemon_threads = True
+
+class _Handler(StreamRequestHandler):
+
+    """ Handle one request: a JSON object on one line, answered by a JSON
+    object on one line. """
+
+    def handle(self):
+
+        """ Handle request. """
+
+        try:
+            request = json.loads(self.rfile.readline())
+            reply = self.server.daemon.handle(request)
+        except Exception as error:
+            reply = {'error': str(error)}
+        self.wfile.write(json.dumps(reply) + '\n')
+
+class PlotDaemon(object):
+
+    """ Service keeping ROOT and the plotting classes loaded in a pool of
+    worker processes. Jobs ("plot this DAQ directory") are submitted over a
+    Unix socket and run by at most the given number of workers at once,
+    further jobs wait in a queue.
+
+    The state of a job is pending (queued or running), done or failed (with
+    the error, e.g. the traceback of the job or the message that its worker
+    process died). Running jobs have the process id of their worker. Only the
+    last max_jobs finished jobs are kept.
+
+    Requests are JSON objects with the key command:
+      plot:     path_logs (absolute path), only, skip (lists of plot
+                families), force; the reply contains the id of the job
+      status:   optional id; the reply contains the job(s)
+      wait:     id; waits until the job is finished, the reply contains it
+      shutdown: stop the service after the running jobs """
+
+    max_jobs = 100
+
+    def __init__(self, path=socket_path, workers=1):
+
+        """ Initialize instances. """
+
+        self._path = path
+        self._workers = workers
+        self._jobs = {}
+        self._results = {}
+        self._next_id = 1
+        self._started = SimpleQueue()
+        self._lock = Lock()
+        self._pool = None
+        self._server = None
+
+    def serve(self):
+
+        """ Run the service until it gets a shutdown request. """
+
+        if exists(self._path):
+            if is_running(self._path):
+                raise IOError('A daemon is already listening on %s.'
+                              % self._path)
+            # Left over from a daemon which did not stop cleanly
+            remove(self._path)
+
+        self._pool = Pool(self._workers, _initialize_worker, (self._started,))
+        self._server = _Server(self._path, _Handler)
+        # Only the user running the daemon may submit jobs
+        chmod(self._path, 0o600)
+        self._server.daemon = self
+        print 'Listening on %s with %s workers.' % (self._path, self._workers)
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+            remove(self._path)
+            self._pool.close()
+            # Jobs of dead worker processes never return, so the pool is not
+            # joined before the jobs are finished
+            for id in sorted(self._jobs):
+                self._wait_job(id)
+            self._pool.terminate()
+            self._pool.join()
+
+    def handle(self, request):
+
+        """ Return reply to request. """
+
+        command = request.get('command')
+        if command == 'plot':
+            return self._submit(request)
+        if command == 'status':
+            if 'id' in request:
+                return {'job': self._check_job(request['id'])}
+            with self._lock:
+                ids = sorted(self._jobs)
+            return {'jobs': [self._check_job(id) for id in ids]}
+        if command == 'wait':
+            return {'job': self._wait_job(request['id'])}
+        if command == 'shutdown':
+            Thread(target=self._server.shutdown).start()
+            return {}
+        raise ValueError('Unknown command %s.' % command)
+
+    def _submit(self, request):
+
+        """ Submit plot job, return its id. """
+
+        # The daemon runs in its own working directory, relative paths are
+        # resolved by the client
+        if not isabs(request['path_logs']):
+            raise ValueError('The path %s is not absolute.'
+                             % request['path_logs'])
+
+        # JSON strings are unicode, ROOT wants str
+        path_logs = str(request['path_logs'])
+        args = (path_logs, [str(name) for name in request.get('only', [])],
+                [str(name) for name in request.get('skip', [])],
+                bool(request.get('force', False)))
+
+        def finished(result):
+            with self._lock:
+                job = self._jobs.get(id)
+                if job is None:
+                    return
+                job['finished'] = time()
+                if result[0]:
+                    job['state'] = 'done'
+                    job['produced'], job['up_to_date'] = result[1]
+                else:
+                    job['state'] = 'failed'
+                    job['error'] = result[1]
+
+        # The callback is called from another thread, after the job is added
+        with self._lock:
+            self._prune_jobs()
+            id = self._next_id
+            self._next_id += 1
+            self._jobs[id] = {'id': id, 'path_logs': path_logs,
+                              'state': 'pending', 'submitted': time()}
+            self._results[id] = self._pool.apply_async(_run_job, (id,) + args,
+                                                       callback=finished)
+
+        return {'id': id}
+
+    def _wait_job(self, id):
+
+        """ Wait until job is finished, return copy of job. """
+
+        job = self._check_job(id)
+        with self._lock:
+            result = self._results.get(id)
+        while job['state'] == 'pending':
+            result.wait(1.)
+            job = self._check_job(id)
+
+        return job
+
+    def _check_job(self, id):
+
+        """ Mark job as failed if it is pending although it raised an
+        exception outside of _run_job() or its worker process died, return
+        copy of job. """
+
+        with self._lock:
+            while not self._started.empty():
+                id_started, pid = self._started.get()
+                if id_started in self._jobs:
+                    self._jobs[id_started]['pid'] = pid
+            result = self._results.get(id)
+        job = self._get_job(id)
+        if job['state'] != 'pending' or result is None:
+            return job
+
+        if result.ready():
+            # The callback is only called for jobs which returned
+            try:
+                result.get()
+            except Exception as error:
+                return self._fail_job(id, '%s: %s'
+                                      % (type(error).__name__, error))
+            return self._get_job(id)
+
+        pid = job.get('pid')
+        if pid is not None and not _is_alive(pid):
+            # The result may still be on its way from the worker process
+            result.wait(1.)
+            if result.ready():
+                return self._check_job(id)
+            return self._fail_job(id, 'Worker process %s died while running '
+                                  'the job.' % pid)
+
+        return job
+
+    def _fail_job(self, id, error):
+
+        """ Mark pending job as failed with message error, return copy of
+        job. """
+
+        with self._lock:
+            job = self._jobs[id]
+            if job['state'] == 'pending':
+                job['state'] = 'failed'
+                job['error'] = error
+                job['finished'] = time()
+
+        return self._get_job(id)
+
+    def _prune_jobs(self):
+
+        """ Forget the oldest finished jobs beyond the last max_jobs (call
+        with lock held). """
+
+        finished = [id for id in sorted(self._jobs)
+                    if self._jobs[id]['state'] != 'pending']
+        for id in finished[:max(len(finished) - self.max_jobs, 0)]:
+            del self._jobs[id]
+            del self._results[id]
+
+    def _get_job(self, id):
+
+        """ Return copy of job. """
+
+        with self._lock:
+            if id not in self._jobs:
+                raise KeyError('There is no job %s.' % id)
+            return dict(self._jobs[id])
+
+def request(request, path=socket_path):
+
+    """ Send request to daemon listening on path and return reply. """
+
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(path)
+        client.sendall(json.dumps(request) + '\n')
+        reply = json.loads(client.makefile().readline())
+    finally:
+        client.close()
+
+    if 'error' in reply:
+        raise RuntimeError(reply['error'])
+
+    return reply
+
+def is_running(path=socket_path):
+
+    """ Return True if a daemon is listening on path. """
+
+    try:
+        request({'command': 'status'}, path)
+    except socket.error:
+        return False
+
+    return True
+
+if __name__ == '__main__':
+
+    parser = ArgumentParser(description='Long-lived service producing the '
+                            'plots of DAQ directories.')
+    parser.add_argument('--socket', default=socket_path,
+                        help='path of the Unix socket (default from '
+                        'MPA_DAEMON)')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='number of jobs running at once')
+    args = parser.parse_args()
+
+    PlotDaemon(args.socket, args.workers).serve()
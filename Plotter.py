@@ -1,10 +1,32 @@
 #!/usr/bin/env python2
 
 """ Author: Basil Schneider <basil.schneider@cern.ch>
-Parent class for plotting scripts to visualize the output of the MPA Light. """
+Parent class for plotting scripts to visualize the output of the MPA Light.
+Reading the logfiles does not import ROOT, see LazyRoot. """
 
-from ROOT import gROOT, TCanvas, gStyle
+from multiprocessing import Pool
+import numpy as np
 from MPA import MPA
+from Geometry import Geometry
+from Accumulator import Accumulator
+from Renderer import Renderer
+import HitMapDecoder
+from ParseCache import ParseCache
+from Profiler import Profiler
+import Settings
+
+# Plotter whose MPAs are processed by the worker processes, see
+# Plotter._map_mpas(); the workers get it (and its data) when they are forked
+_plotter = None
+
+def _run_mpa(args):
+
+    """ Return result of method of _plotter for one MPA and the profile
+    recorded by it (runs in worker process). """
+
+    method, idx_mpa = args
+    Profiler.reset()
+    return getattr(_plotter, method)(idx_mpa), Profiler.get_records()
 
 class Plotter(object):
 
@@ -16,19 +38,21 @@ class Plotter(object):
     _no_pxs_y = 3
     _no_mems = 96
 
-    # ROOT batch mode
-    gROOT.SetBatch(True)
-    # No statistics in plots
-    gStyle.SetOptStat(0)
+    # Geometry objects of the MPA chips, built once for each class and MPA
+    _geometries = {}
 
-    def _initialize_mpas(self, size):
+    # Number of bytes of the logfile parsed at once if the data is stored out
+    # of core (see MPA.storage_dir)
+    _chunk_bytes = 1 << 26
+
+    def _initialize_mpas(self, size, hit_map=False):
 
         """ Initialize MPA objects. """
 
         # Create 6 MPA objects
         self._MPAs = []
         for i in range(0, self._no_mpas):
-            self._MPAs.append(MPA(size))
+            self._MPAs.append(MPA(size, hit_map))
 
     def get_mpas(self):
 
@@ -40,32 +64,215 @@ class Plotter(object):
 
         """ Read in raw logfile and fill MPA objects. """
 
-        # Open raw logfile
-        with open(logfile, 'r') as logfile:
-            for idx, line in enumerate(logfile):
-                # Each line corresponds to one MPA object
-                # The correct MPA object is found by idx % len(MPA)
-                self._MPAs[idx % len(self._MPAs)].set_no_hits_shutter([int(val) for val
-                                                           in line.split()])
+        with Profiler.stage('parse'):
+            if MPA.storage_dir is None:
+                self._add_lines(self._load_matrix(logfile))
+            else:
+                self._stream_matrix(logfile)
+
+    def read_lines_raw(self, raw, first_line=0, logfile=''):
+
+        """ Parse complete lines of raw logfile (string) and add them to MPA
+        objects. The first line in raw is line first_line of the logfile.
+        Return number of lines. """
+
+        with Profiler.stage('parse'):
+            data = self._parse_matrix(raw, logfile)
+            self._add_lines(data, first_line)
+
+        return len(data)
+
+    def _add_lines(self, data, first_line=0):
+
+        """ Add parsed lines (2d array) of raw logfile to MPA objects. The
+        first row of data is line first_line of the logfile. """
+
+        # Each line corresponds to one MPA object
+        # The lines of the MPA objects are interleaved, so every
+        # len(self._MPAs)-th line belongs to the same MPA object
+        for idx, MPA in enumerate(self._MPAs):
+            MPA.add_no_hits_shutters(data[(idx - first_line) %
+                                          len(self._MPAs)::len(self._MPAs)])
+
+    def _stream_matrix(self, logfile):
+
+        """ Parse raw logfile in chunks of complete lines and add them to MPA
+        objects, so the memory needed does not depend on the size of the
+        logfile. The parse cache is not used. """
+
+        first_line = 0
+        rest = ''
+        with open(logfile, 'r') as f_log:
+            while True:
+                raw = f_log.read(self._chunk_bytes)
+                if not raw:
+                    break
+
+                # Only parse complete lines
+                raw = rest + raw
+                end = raw.rfind('\n') + 1
+                rest = raw[end:]
+                if end == 0:
+                    continue
+
+                data = self._parse_matrix(raw[:end], logfile)
+                self._add_lines(data, first_line)
+                first_line += len(data)
+
+        # Last line is not necessarily terminated
+        if rest.strip():
+            self._add_lines(self._parse_matrix(rest, logfile), first_line)
+
+    def _load_matrix(self, logfile):
+
+        """ Return content of raw logfile as 2d array, from the parse cache if
+        possible. """
+
+        no_elements = self._MPAs[0].no_elements
+        hit_map = self._MPAs[0].hit_map
+
+        if not ParseCache.enabled:
+            return self._read_matrix(logfile)
+
+        cache = ParseCache(logfile)
+        data = cache.load(no_elements, hit_map)
+        if data is None:
+            # State before reading, the logfile may grow while it is parsed
+            state = cache.get_state()
+            data = self._read_matrix(logfile)
+            cache.store(data, no_elements, hit_map, state)
+
+        return data
+
+    def _read_matrix(self, logfile):
+
+        """ Parse raw logfile in one go and return its content as 2d array
+        (lines x elements). """
+
+        with open(logfile, 'r') as f_log:
+            return self._parse_matrix(f_log.read(), logfile)
+
+    def _parse_matrix(self, raw, logfile):
+
+        """ Parse content of raw logfile and return it as 2d array (lines x
+        elements). """
+
+        no_elements = self._MPAs[0].no_elements
+
+        # Count lines, the last line is not necessarily terminated
+        no_lines = raw.count('\n')
+        if raw and not raw.endswith('\n'):
+            no_lines += 1
+
+        if self._MPAs[0].hit_map:
+            # Hit maps are numbers made of 0's and 1's, which are too long
+            # for 64 bit integers, read them as bits instead
+            values = HitMapDecoder.pack(raw.split())
+        else:
+            values = np.fromstring(raw, dtype=np.int64, sep=' ')
+
+        # Check shape once for the whole file
+        if values.size != no_lines*no_elements:
+            raise TypeError('The logfile %s does not contain %s values on '
+                            'each of its %s lines.'
+                            % (logfile, no_elements, no_lines))
+
+        return values.reshape(no_lines, no_elements)
+
+    def _fill_histo(self, histogram, x, y=None, weights=None, variances=None):
+
+        """ Fill arrays of values into histogram at once, see
+        Accumulator.fill(). Return histogram. """
+
+        with Profiler.stage('fill'):
+            return Accumulator(histogram).fill(x, y, weights,
+                                               variances).flush()
+
+    def _add_histo(self, histogram, accumulator):
+
+        """ Add content of accumulator (e.g. filled in a worker process, see
+        _map_mpas()) to histogram at once. Return histogram. """
+
+        with Profiler.stage('fill'):
+            return Accumulator(histogram).add(accumulator).flush()
+
+    def _map_mpas(self, method, no_mpas=None):
+
+        """ Return list of the results of method (name of a method taking
+        the index of an MPA) for all MPAs, in the order of the MPAs. With
+        jobs > 1, the MPAs are computed by worker processes forked for this
+        call, which get the data with the fork, so only the results are sent
+        back, together with the profile recorded by the workers. The method
+        must not use ROOT and should return small results, e.g. accumulators
+        from Accumulator.from_axes(). """
+
+        global _plotter
+
+        if no_mpas is None:
+            no_mpas = len(self._MPAs)
+
+        jobs = Settings.get_jobs()
+        with Profiler.stage('fill'):
+            if jobs <= 1 or no_mpas <= 1:
+                return [getattr(self, method)(idx_mpa)
+                        for idx_mpa in range(0, no_mpas)]
+
+            _plotter = self
+            pool = Pool(min(jobs, no_mpas))
+            try:
+                results = pool.map(_run_mpa, [(method, idx_mpa) for idx_mpa
+                                              in range(0, no_mpas)])
+            finally:
+                pool.close()
+                pool.join()
+                _plotter = None
+
+            for _, records in results:
+                Profiler.add_records(records)
+
+            return [result for result, _ in results]
+
+    def _get_map_axes(self):
+
+        """ Return binning of the 2d maps of an MPA, see
+        Accumulator.from_axes(). """
+
+        return [(self._no_pxs_x, 0, self._no_pxs_x),
+                (self._no_pxs_y, 0, self._no_pxs_y)]
 
     def _save_histo(self, histogram, path, x_title='', y_title='',
                     leg=None, draw_option='', logy=False, max=None, min=None):
 
-        """ Plot and save histogram as PDF. """
-
-        canvas = TCanvas()
-        histogram.Draw(draw_option)
-        histogram.GetXaxis().SetTitle(x_title)
-        histogram.GetYaxis().SetTitle(y_title)
-        if not min == None:
-            histogram.SetMinimum(min)
-        if not max == None:
-            histogram.SetMaximum(max)
-        if logy:
-            canvas.SetLogy()
-        if leg != None:
-            leg.Draw()
-        canvas.SaveAs(path)
+        """ Plot and save histogram as PDF (possibly in a worker process, see
+        Renderer). """
+
+        with Profiler.stage('render'):
+            Renderer.render(histogram, path, leg=leg, x_title=x_title,
+                            y_title=y_title, draw_option=draw_option,
+                            logy=logy, max=max, min=min)
+
+    def _get_geometry(self, idx_mpa):
+
+        """ Return Geometry object of MPA chip. The layout is defined by
+        _get_layout() of the derived class. """
+
+        key = (self.__class__, idx_mpa)
+        if key not in self._geometries:
+            geometry = Geometry()
+            geometry.set_geometry(self._get_layout(idx_mpa))
+            self._geometries[key] = geometry
+
+        return self._geometries[key]
+
+    def _get_layout(self, idx_mpa):
+
+        """ Return layout of MPA chip, see Geometry.set_geometry(). By
+        default, the pixels are numbered row by row from the top left corner.
+        Derived classes override this with the layout their data is stored
+        in. """
+
+        return [range(row*self._no_pxs_x, (row+1)*self._no_pxs_x)
+                for row in range(0, self._no_pxs_y)]
 
     def _get_fill_color(self, idx):
 
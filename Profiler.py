@@ -0,0 +1,209 @@
+#!/usr/bin/env python2
+
+""" Author: Basil Schneider <basil.schneider@cern.ch>
+Record time, counts and memory of the stages of a run. """
+
+import json
+from os import environ
+from resource import getrusage, RUSAGE_SELF
+from time import time
+
+class _Stage(object):
+
+    """ Context manager recording one call of a stage. """
+
+    def __init__(self, name):
+
+        """ Initialize instances. """
+
+        self._name = name
+
+    def __enter__(self):
+
+        """ Start stage. """
+
+        Profiler._stack.append(self._name)
+        self._start = time()
+        self._peak_memory = Profiler._get_peak_memory()
+
+    def __exit__(self, *exc_info):
+
+        """ End stage. """
+
+        seconds = time() - self._start
+        name = '/'.join(Profiler._stack)
+        Profiler._stack.pop()
+
+        stage = Profiler._get_stage(name)
+        stage['calls'] += 1
+        stage['seconds'] += seconds
+        stage['memory_growth_mb'] = max(stage['memory_growth_mb'],
+                                        Profiler._get_peak_memory() -
+                                        self._peak_memory)
+
+class _NoStage(object):
+
+    """ Context manager doing nothing, used if profiling is disabled. """
+
+    def __enter__(self):
+
+        """ Do nothing. """
+
+    def __exit__(self, *exc_info):
+
+        """ Do nothing. """
+
+class Profiler(object):
+
+    """ Profile of a run. Stages are recorded with
+
+        with Profiler.stage('name'):
+            ...
+
+    Stages can be nested, nested stages are named 'outer/inner'. For each
+    stage, the number of calls, the wall time, the memory growth and the
+    counts added with Profiler.count() while it was running are recorded.
+    The memory growth is how much the peak resident memory of the process
+    rose during a call (the maximum of all calls). A stage needing less
+    memory than an earlier one does not raise the peak, so its growth is 0,
+    the peak of the whole process is in the report.
+
+    Profiling is enabled with the environment variable MPA_PROFILE (set to
+    the path of the report, or to 1 for profile.json) or by setting
+    Profiler.enabled. If it is disabled, stage() and count() do nothing.
+
+    Forked worker processes record into their own copy of the profile. They
+    call reset() before their work and send get_records() back, which the
+    parent adds with add_records(). """
+
+    enabled = environ.get('MPA_PROFILE', '0') != '0'
+
+    path = environ.get('MPA_PROFILE', '1')
+    if path == '1':
+        path = 'profile.json'
+
+    _start = time()
+    _stack = []
+    _stages = {}
+    _counts = {}
+    _no_stage = _NoStage()
+
+    @classmethod
+    def stage(cls, name):
+
+        """ Return context manager recording stage name. """
+
+        if not cls.enabled:
+            return cls._no_stage
+
+        return _Stage(name)
+
+    @classmethod
+    def count(cls, name, number=1):
+
+        """ Add number to counter name of the run and of all running stages.
+        """
+
+        if not cls.enabled:
+            return
+
+        cls._counts[name] = cls._counts.get(name, 0) + number
+        for idx in range(1, len(cls._stack)+1):
+            counts = cls._get_stage('/'.join(cls._stack[:idx]))['counts']
+            counts[name] = counts.get(name, 0) + number
+
+    @classmethod
+    def reset(cls):
+
+        """ Forget the stages and counts recorded so far. The running stages
+        are kept, so later counts are still added to them. """
+
+        cls._stages = {}
+        cls._counts = {}
+
+    @classmethod
+    def get_records(cls):
+
+        """ Return stages and counts recorded since reset(), see
+        add_records(). """
+
+        return cls._stages, cls._counts
+
+    @classmethod
+    def add_records(cls, records):
+
+        """ Add stages and counts of get_records() of another process. The
+        calls, seconds and counts are added up (the seconds of parallel
+        processes can be more than the wall time), the memory growth is the
+        maximum of the processes. """
+
+        stages, counts = records
+        for name, number in counts.items():
+            cls._counts[name] = cls._counts.get(name, 0) + number
+        for name, other in stages.items():
+            stage = cls._get_stage(name)
+            stage['calls'] += other['calls']
+            stage['seconds'] += other['seconds']
+            stage['memory_growth_mb'] = max(stage['memory_growth_mb'],
+                                            other['memory_growth_mb'])
+            for count, number in other['counts'].items():
+                stage['counts'][count] = stage['counts'].get(count, 0) + number
+
+    @classmethod
+    def get_report(cls):
+
+        """ Return report as dictionary. """
+
+        return {'seconds': time() - cls._start,
+                'peak_memory_mb': cls._get_peak_memory(),
+                'counts': cls._counts,
+                'stages': cls._stages}
+
+    @classmethod
+    def get_summary(cls):
+
+        """ Return one line summary of the report. """
+
+        report = cls.get_report()
+        summary = ['%.1f s' % report['seconds']]
+        # Top level stages only
+        for name, stage in sorted(report['stages'].items()):
+            if '/' not in name:
+                summary.append('%s %.1f s' % (name, stage['seconds']))
+        for name in sorted(report['counts']):
+            summary.append('%s %s' % (report['counts'][name], name))
+        summary.append('peak memory %.0f MB' % report['peak_memory_mb'])
+
+        return 'Profile: %s' % ', '.join(summary)
+
+    @classmethod
+    def write_report(cls, path=None):
+
+        """ Write report as JSON to path (default Profiler.path) and print
+        summary, if profiling is enabled. """
+
+        if not cls.enabled:
+            return
+
+        with open(path or cls.path, 'w') as f_report:
+            json.dump(cls.get_report(), f_report, indent=1, sort_keys=True)
+        print '%s (report in %s)' % (cls.get_summary(), path or cls.path)
+
+    @classmethod
+    def _get_stage(cls, name):
+
+        """ Return record of stage name. """
+
+        if name not in cls._stages:
+            cls._stages[name] = {'calls': 0, 'seconds': 0.,
+                                 'memory_growth_mb': 0., 'counts': {}}
+
+        return cls._stages[name]
+
+    @staticmethod
+    def _get_peak_memory():
+
+        """ Return peak resident memory of the process in MB. """
+
+        # ru_maxrss is in kB on Linux
+        return getrusage(RUSAGE_SELF).ru_maxrss/1024.
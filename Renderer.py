@@ -0,0 +1,299 @@
+#!/usr/bin/env python2
+
+""" Author: Basil Schneider <basil.schneider@cern.ch>
+Render histograms to files, optionally in a pool of worker processes. """
+
+import atexit
+import cPickle as pickle
+import hashlib
+import json
+from multiprocessing import Pool
+from os import environ, utime
+from os.path import basename, dirname, isfile, join, normpath, splitext
+import numpy as np
+from LazyRoot import get_root
+from Accumulator import get_buffers
+from Profiler import Profiler
+import Settings
+
+def draw(histogram, path, x_title='', y_title='', leg=None, draw_option='',
+         logy=False, max=None, min=None):
+
+    """ Plot and save histogram as PDF. """
+
+    canvas = get_root().TCanvas()
+    draw_on(canvas, histogram, x_title, y_title, leg, draw_option, logy, max,
+            min)
+    canvas.SaveAs(path)
+
+def draw_on(canvas, histogram, x_title='', y_title='', leg=None,
+            draw_option='', logy=False, max=None, min=None):
+
+    """ Plot histogram on canvas. """
+
+    canvas.cd()
+    histogram.Draw(draw_option)
+    histogram.GetXaxis().SetTitle(x_title)
+    histogram.GetYaxis().SetTitle(y_title)
+    if not min == None:
+        histogram.SetMinimum(min)
+    if not max == None:
+        histogram.SetMaximum(max)
+    canvas.SetLogy(logy)
+    if leg != None:
+        leg.Draw()
+
+def get_digest(objects, options):
+
+    """ Return hash of the content and style of the histograms, stacks and
+    legends in the list objects and of the options of draw(). """
+
+    digest = hashlib.sha1(repr(sorted(options.items())))
+    for obj in objects:
+        if obj is None:
+            continue
+        if obj.InheritsFrom('TLegend'):
+            for entry in obj.GetListOfPrimitives():
+                digest.update(repr((entry.GetLabel(), entry.GetOption())))
+            continue
+        if obj.InheritsFrom('THStack'):
+            digest.update(repr((obj.GetName(), obj.GetTitle())))
+            histograms = obj.GetHists() or []
+        else:
+            histograms = [obj]
+        for histogram in histograms:
+            _update_digest(digest, histogram)
+
+    return digest.hexdigest()
+
+def _update_digest(digest, histogram):
+
+    """ Add content and style of histogram to digest. """
+
+    # Contents and errors are read from the buffers of the histogram at once
+    digest.update(np.concatenate(get_buffers(histogram)).tostring())
+
+    # Axis titles, minimum and maximum are not included, they are set by
+    # draw() from the options, so they depend on whether the histogram was
+    # drawn before (e.g. on its own before being drawn in a stack)
+    axes = [histogram.GetXaxis(), histogram.GetYaxis()]
+    digest.update(repr((histogram.GetName(), histogram.GetTitle(),
+                        [(axis.GetNbins(), axis.GetXmin(), axis.GetXmax())
+                         for axis in axes],
+                        histogram.GetLineColor(), histogram.GetLineStyle(),
+                        histogram.GetFillColor(), histogram.GetMarkerSize())))
+
+def _initialize_worker():
+
+    """ Set up ROOT in worker process. """
+
+    # Histograms of different jobs can have the same name
+    get_root().TH1.AddDirectory(False)
+
+def _draw_serialized(payload, path, options):
+
+    """ Plot and save serialized histogram and legend (runs in worker
+    process). """
+
+    histogram, leg = pickle.loads(payload)
+    draw(histogram, path, leg=leg, **options)
+
+class Renderer(object):
+
+    """ Queue for rendering histograms. With jobs > 1, the histograms are
+    serialized when they are submitted (so later changes to them have no
+    effect on the output) and rendered by a pool of worker processes, each
+    running its own batch mode ROOT. Otherwise they are rendered directly.
+
+    The number of worker processes is set with Settings.set_jobs() (default
+    from the environment variable MPA_JOBS). wait() has to be called to make sure
+    all files are written.
+
+    With Renderer.bundle set to True, all histograms of one directory (one
+    plot family) are written as pages of a single PDF <directory>.pdf in that
+    directory instead, using one canvas for all pages. The names of the pages
+    are listed in <directory>_index.txt. Bundles are always written by the
+    calling process, since the pages have to be written in order.
+
+    With Renderer.cache set to True (default, disable with the environment
+    variable MPA_RENDER_CACHE=0), a file is only written if the content or
+    style of its histograms or the drawing options changed since it was
+    written last. The hashes of the files are kept in the manifest
+    .render_manifest.json of each directory, written by wait(). Unchanged
+    files are only touched, so they are newer than the inputs of their plot
+    family (see Tasks). """
+
+    bundle = environ.get('MPA_BUNDLE', '0') != '0'
+
+    cache = environ.get('MPA_RENDER_CACHE', '1') != '0'
+
+    # Name of the manifests and the manifests read or changed (directory ->
+    # dictionary file name -> hash)
+    _manifest_name = '.render_manifest.json'
+    _manifests = {}
+
+    # Maximum number of submitted, not yet rendered histograms per worker
+    _max_pending = 8
+
+    _pool = None
+    _pending = []
+
+    # Canvas for all pages of the bundles, the bundle currently written (path
+    # of PDF and list of page names) and the directories with bundles
+    _canvas = None
+    _bundle = None
+    _bundle_dirs = {}
+
+    @classmethod
+    def render(cls, histogram, path, leg=None, **options):
+
+        """ Plot and save histogram as PDF, see draw() for the options. """
+
+        if cls.bundle:
+            cls._add_page(histogram, path, leg, options)
+            return
+
+        if cls.is_unchanged(path, [histogram, leg], options):
+            return
+
+        # Each histogram gets its own canvas (in a worker process if jobs > 1)
+        Profiler.count('canvases')
+
+        jobs = Settings.get_jobs()
+        if jobs <= 1:
+            try:
+                draw(histogram, path, leg=leg, **options)
+            except Exception:
+                # The recorded hashes can be wrong now
+                cls._manifests = {}
+                raise
+            return
+
+        if cls._pool is None:
+            cls._pool = Pool(jobs, _initialize_worker)
+
+        # Limit memory needed for serialized histograms
+        while len(cls._pending) >= cls._max_pending*jobs:
+            cls._pending.pop(0).get()
+
+        payload = pickle.dumps((histogram, leg), pickle.HIGHEST_PROTOCOL)
+        cls._pending.append(cls._pool.apply_async(_draw_serialized,
+                                                  (payload, path, options)))
+
+    @classmethod
+    def is_unchanged(cls, path, objects, options):
+
+        """ Return True if file path exists and was written from the same
+        histograms, stacks and legends objects with the same options, see
+        get_digest(). The file is then touched. Otherwise the new hash is
+        recorded for the manifest and the caller has to write the file. """
+
+        if not cls.cache:
+            return False
+
+        directory = normpath(dirname(path))
+        if directory not in cls._manifests:
+            cls._manifests[directory] = cls._read_manifest(directory)
+        manifest = cls._manifests[directory]
+
+        digest = get_digest(objects, options)
+        if manifest.get(basename(path)) == digest and isfile(path):
+            utime(path, None)
+            Profiler.count('plots_unchanged')
+            return True
+
+        manifest[basename(path)] = digest
+        return False
+
+    @classmethod
+    def _read_manifest(cls, directory):
+
+        """ Return manifest of directory (empty if there is none). """
+
+        try:
+            with open(join(directory, cls._manifest_name)) as f_manifest:
+                return json.load(f_manifest)
+        except (IOError, ValueError):
+            return {}
+
+    @classmethod
+    def _write_manifests(cls):
+
+        """ Write manifests of all directories with files. """
+
+        for directory, manifest in cls._manifests.items():
+            with open(join(directory, cls._manifest_name), 'w') as f_manifest:
+                json.dump(manifest, f_manifest, indent=1, sort_keys=True)
+        cls._manifests = {}
+
+    @classmethod
+    def _add_page(cls, histogram, path, leg, options):
+
+        """ Plot histogram as new page of the bundle of its directory. """
+
+        directory = normpath(dirname(path))
+        if cls._bundle is None or cls._bundle[0] != directory:
+            cls._close_bundle()
+
+            # Each time a directory is continued after another one, a new
+            # part is started, since PDFs cannot be appended to
+            part = cls._bundle_dirs.get(directory, 0) + 1
+            cls._bundle_dirs[directory] = part
+            name = basename(directory)
+            if part > 1:
+                name += '_part%s' % part
+            cls._bundle = (directory, join(directory, '%s.pdf' % name), [])
+
+            if cls._canvas is None:
+                cls._canvas = get_root().TCanvas()
+                Profiler.count('canvases')
+            cls._canvas.Print('%s[' % cls._bundle[1])
+
+        page = splitext(basename(path))[0]
+        cls._canvas.Clear()
+        draw_on(cls._canvas, histogram, leg=leg, **options)
+        cls._canvas.Print(cls._bundle[1], 'Title:%s' % page)
+        cls._bundle[2].append(page)
+
+    @classmethod
+    def _close_bundle(cls):
+
+        """ Close the bundle currently written and write its index. """
+
+        if cls._bundle is None:
+            return
+
+        directory, path, pages = cls._bundle
+        cls._canvas.Print('%s]' % path)
+        with open('%s_index.txt' % splitext(path)[0], 'w') as f_index:
+            for idx, page in enumerate(pages):
+                f_index.write('%s %s\n' % (idx+1, page))
+        cls._bundle = None
+
+    @classmethod
+    def wait(cls):
+
+        """ Wait until all submitted histograms are rendered and all bundles
+        are closed, and stop the worker processes. Errors of the workers are
+        raised here. """
+
+        cls._close_bundle()
+        cls._bundle_dirs = {}
+
+        if cls._pool is not None:
+            try:
+                while cls._pending:
+                    cls._pending.pop(0).get()
+            except Exception:
+                # The recorded hashes can be wrong now
+                cls._manifests = {}
+                raise
+            finally:
+                cls._pool.close()
+                cls._pool.join()
+                cls._pool = None
+
+        # Only after all files are written
+        cls._write_manifests()
+
+atexit.register(Renderer.wait)
@@ -5,9 +5,12 @@ Simple plotting script to visualize the output of the MPA Light asynchronous
 readout (ripple counter). """
 
 from os import system
-from ROOT import TCanvas, TH1F, THStack, TLegend, TH2F
+import numpy as np
 from Plotter import Plotter
-from Geometry import Geometry
+from LazyRoot import get_root
+from Accumulator import Accumulator
+from Profiler import Profiler
+from Renderer import Renderer
 
 class RippleCounter(Plotter):
 
@@ -25,39 +28,50 @@ class RippleCounter(Plotter):
         """ Plot ripples vs. shutter. That is one plot per pixel and one for the
         total. """
 
+        ROOT = get_root()
+
         system('mkdir -p %s' % path)
         name = 'ripples_per_shutter_px%s_MPA%s'
         x_title = 'Shutter'
         y_title = 'Ripple count'
 
         # Get number of shutters
-        no_shutters = len(self._MPAs[0].get_no_hits_shutter())
+        no_shutters = self._MPAs[0].get_no_shutters()
 
         # Create THStack and its TLegend
-        stack = THStack(name % ('all', 'all'), name % ('all', 'all'))
-        leg = TLegend(.9, .5, 1., .9)
+        stack = ROOT.THStack(name % ('all', 'all'), name % ('all', 'all'))
+        leg = ROOT.TLegend(.9, .5, 1., .9)
+
+        # Shutter numbers
+        shutters = np.arange(1, no_shutters+1)
+
+        # Sums over all pixels of each MPA (in parallel with jobs > 1)
+        accs_mpa = self._map_mpas('_fill_ripples_shutter')
 
         # Plots for each pixel and each MPA
         for idx_mpa, MPA in enumerate(self._MPAs):
 
             # Histogram for all pixels on one MPA
-            h_mpa = TH1F(name % ('all', idx_mpa), name % ('all', idx_mpa),
-                         no_shutters, .5, no_shutters+.5)
+            h_mpa = ROOT.TH1F(name % ('all', idx_mpa),
+                              name % ('all', idx_mpa),
+                              no_shutters, .5, no_shutters+.5)
+
+            data = MPA.get_data()
 
             for px in range(0, self._no_pxs_x*self._no_pxs_y):
 
                 # Histogram for one pixel on one MPA
-                h_mpa_px = TH1F(name % (px, idx_mpa), name % (px, idx_mpa),
-                                 no_shutters, .5, no_shutters+.5)
+                h_mpa_px = ROOT.TH1F(name % (px, idx_mpa),
+                                     name % (px, idx_mpa),
+                                     no_shutters, .5, no_shutters+.5)
 
-                for shutter in range(0, no_shutters):
-                    h_mpa_px.Fill(shutter+1, MPA.get_no_hits_shutter()[shutter][px])
-                    h_mpa.Fill(shutter+1, MPA.get_no_hits_shutter()[shutter][px])
+                self._fill_histo(h_mpa_px, shutters, weights=data[:, px])
 
                 self._save_histo(h_mpa_px,
                                  '%s/%s.pdf' % (path, name % (px, idx_mpa)),
                                  x_title, y_title)
 
+            self._add_histo(h_mpa, accs_mpa[idx_mpa])
             self._save_histo(h_mpa,
                              '%s/%s.pdf' % (path, name % ('all', idx_mpa)),
                              x_title, y_title)
@@ -76,11 +90,9 @@ class RippleCounter(Plotter):
         system('mkdir -p %s' % path)
         name = 'ripples_maps_MPA%s'
 
-        # Get number of shutters
-        no_shutters = len(self._MPAs[0].get_no_hits_shutter())
-
         # Histogram for all pixels and all MPA's
         map_merged = self._create_map(name % 'merged')
+        acc_merged = Accumulator(map_merged)
 
         # List to store map objects for later plotting
         maps = []
@@ -88,27 +100,17 @@ class RippleCounter(Plotter):
         # Find maximum Z for adjusting Z range later
         z_max = 0
 
-        # Plots for each pixel and each MPA
-        for idx_mpa, MPA in enumerate(self._MPAs):
+        # Maps of each MPA (in parallel with jobs > 1)
+        accs_mpa = self._map_mpas('_fill_map')
 
-            # Define layout of MPA chip
-            geometry = Geometry()
-            if idx_mpa in [0, 1, 2]:
-                geometry.set_geometry([range(32, 48), range(31, 15, -1),
-                                       range(0, 16)])
-            else:
-                geometry.set_geometry([range(15, -1, -1), range(16, 32),
-                                       range(47, 31, -1)])
+        # Plots for each MPA
+        for idx_mpa, acc_mpa in enumerate(accs_mpa):
 
             # Histogram for all pixels on one MPA
             map_mpa = self._create_map(name % idx_mpa)
 
-            for px in range(0, self._no_pxs_x*self._no_pxs_y):
-
-                map_mpa.Fill(geometry.get_x(px), geometry.get_y(px),
-                             MPA.get_no_hits()[px])
-                map_merged.Fill(geometry.get_x(px), geometry.get_y(px),
-                             MPA.get_no_hits()[px])
+            self._add_histo(map_mpa, acc_mpa)
+            acc_merged.add(acc_mpa)
 
             # For the map showing all MPA's we want the Z range to be the same
             # Find maximum here
@@ -119,17 +121,53 @@ class RippleCounter(Plotter):
                              '%s/%s.pdf' % (path, name % (idx_mpa)),
                              draw_option='COLZ|TEXT90')
 
+        acc_merged.flush()
         self._save_histo(map_merged,
                          '%s/%s.pdf' % (path, name % ('merged')),
                          draw_option='COLZ|TEXT90')
 
-        self._plot_map_all(maps, path, name, z_max)
+        with Profiler.stage('render'):
+            self._plot_map_all(maps, path, name, z_max)
+
+    def _fill_ripples_shutter(self, idx_mpa):
+
+        """ Return accumulator of the ripples vs. shutter of all pixels of
+        one MPA (see _map_mpas()). """
+
+        data = self._MPAs[idx_mpa].get_data()
+        no_shutters = self._MPAs[0].get_no_shutters()
+        shutters = np.arange(1, no_shutters+1)
+
+        acc_mpa = Accumulator.from_axes([(no_shutters, .5, no_shutters+.5)])
+        for px in range(0, self._no_pxs_x*self._no_pxs_y):
+            acc_mpa.fill(shutters, weights=data[:, px])
+
+        return acc_mpa
+
+    def _fill_map(self, idx_mpa):
+
+        """ Return accumulator of the 2d map of one MPA (see _map_mpas()).
+        """
+
+        # Coordinates of all pixels in map
+        x, y = self._get_geometry(idx_mpa).get_xy(
+            range(0, self._no_pxs_x*self._no_pxs_y))
+
+        return Accumulator.from_axes(self._get_map_axes()) \
+            .fill(x, y, self._MPAs[idx_mpa].get_no_hits())
 
     def _plot_map_all(self, maps, path, name, z_max):
 
         """ Plot all maps in one TCanvas. """
 
-        canvas = TCanvas()
+        path_all = '%s/%s.pdf' % (path, name % ('all'))
+        if Renderer.is_unchanged(path_all, maps, {'z_max': z_max}):
+            return
+
+        ROOT = get_root()
+
+        canvas = ROOT.TCanvas()
+        Profiler.count('canvases')
         canvas.Divide(3, 2)
 
         for idx, map in enumerate(maps):
@@ -145,15 +183,25 @@ class RippleCounter(Plotter):
             map.SetMarkerSize(1.7)
             map.Draw(drawing_option)
 
-        canvas.SaveAs('%s/%s.pdf' % (path, name % ('all')))
+        canvas.SaveAs(path_all)
+
+    def _get_layout(self, idx_mpa):
+
+        """ Return layout of MPA chip. """
+
+        if idx_mpa in [0, 1, 2]:
+            return [range(32, 48), range(31, 15, -1), range(0, 16)]
+        return [range(15, -1, -1), range(16, 32), range(47, 31, -1)]
 
     def _create_map(self, name):
 
         """ Create and return TH2F map. """
 
-        map = TH2F(name, name,
-                   self._no_pxs_x, 0, self._no_pxs_x,
-                   self._no_pxs_y, 0, self._no_pxs_y)
+        ROOT = get_root()
+
+        map = ROOT.TH2F(name, name,
+                        self._no_pxs_x, 0, self._no_pxs_x,
+                        self._no_pxs_y, 0, self._no_pxs_y)
 
         # Set number of ticks on x and y axes
         map.GetXaxis().SetNdivisions(self._no_pxs_x, 0, 0)
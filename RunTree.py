@@ -0,0 +1,342 @@
+#!/usr/bin/env python2
+
+""" Author: Basil Schneider <basil.schneider@cern.ch>
+Decoded data of a run as ROOT trees, analysed with RDataFrame. """
+
+from os import system
+import numpy as np
+from LazyRoot import get_root
+from Accumulator import Accumulator, get_buffers
+from Renderer import Renderer
+from RippleCounter import RippleCounter
+from HitMap import HitMap
+from SynchronousData import SynchronousData
+import HitMapDecoder
+import Settings
+
+class RunTree(object):
+
+    """ ROOT file with the decoded data of one run in two compressed trees:
+
+      events:  one entry per MPA, shutter and memory slot of the synchronous
+               readout, with the branches mpa, shutter, slot, bx (bunch
+               crossing) and hit_map (hit map word, see HitMapDecoder)
+      ripples: one entry per MPA, shutter and pixel of the asynchronous
+               readout, with the branches mpa, shutter, px and ripples
+               (ripple count)
+
+    The ripple counts have no memory slots, so they are in a tree of their
+    own. The histograms of the plotters can be filled from the trees with
+    RDataFrame, using the number of threads of Settings.get_threads()
+    (default from the environment variable MPA_THREADS, 0 for all cores).
+    """
+
+    # Compression of the trees, ZSTD is fast and compresses the mostly empty
+    # memory slots well
+    compression_level = 5
+
+    def __init__(self, path):
+
+        """ Initialize instances for ROOT file path. """
+
+        self._path = path
+        self._results = []
+
+    def write(self, rc, bx, hm):
+
+        """ Write trees from a RippleCounter, a BunchCrossing and a HitMap
+        object which have read their logfiles. """
+
+        ROOT = get_root()
+
+        options = ROOT.RDF.RSnapshotOptions()
+        options.fCompressionAlgorithm = ROOT.ROOT.kZSTD
+        options.fCompressionLevel = self.compression_level
+
+        trees = [('events', self._get_events(bx.get_mpas(), hm.get_mpas())),
+                 ('ripples', self._get_ripples(rc.get_mpas()))]
+        for idx, (name, columns) in enumerate(trees):
+            options.fMode = 'RECREATE' if idx == 0 else 'UPDATE'
+            names = ROOT.std.vector('string')()
+            for column, _ in columns:
+                names.push_back(column)
+            self._from_numpy(dict(columns)).Snapshot(name, self._path, names,
+                                                     options)
+
+    def get_histograms(self):
+
+        """ Return list of (plot family, histogram, options) with all
+        histograms and stacks of RippleCounter.plot_ripples_shutter(),
+        RippleCounter.plot_maps(), BunchCrossing.plot_cts_bx(),
+        HitMap.plot_maps() and SynchronousData.plot_cts_bx_px(), options being
+        the keyword arguments of Renderer.render(). The canvases with the maps
+        of all MPAs are drawn by plot(). All histograms are booked first, so
+        each tree is read only once. """
+
+        ROOT = get_root()
+        threads = Settings.get_threads()
+        if threads != 1:
+            ROOT.EnableImplicitMT(threads)
+
+        no_mpas = RippleCounter._no_mpas
+        no_pxs_x = RippleCounter._no_pxs_x
+        no_pxs_y = RippleCounter._no_pxs_y
+        no_pxs = no_pxs_x*no_pxs_y
+
+        # Number of shutters from the number of entries, without reading the
+        # tree
+        f_tree = ROOT.TFile.Open(self._path)
+        no_shutters = f_tree.Get('ripples').GetEntries()//(no_mpas*no_pxs)
+        f_tree.Close()
+
+        ripples = ROOT.RDataFrame('ripples', self._path) \
+            .Define('shutter_no', 'shutter + 1')
+        events = ROOT.RDataFrame('events', self._path)
+
+        # Bits of the hit map words with hits
+        words = events.Filter('hit_map != 0') \
+            .Define('bits', 'ROOT::VecOps::RVec<int> bits; '
+                    'for (int bit = 0; bit < %s; ++bit) '
+                    'if ((hit_map >> bit) & 1) '
+                    'bits.push_back(bit); '
+                    'return bits;' % HitMapDecoder.no_pxs)
+
+        # Pixels (calibration geometry) with hits of a hit map word, and the
+        # bunch crossing once for each of them
+        calibration = ', '.join(str(px) for px in HitMapDecoder.calibration)
+        sync = words.Filter('bx != 0') \
+            .Define('pxs', 'static const int calibration[] = {%s}; '
+                    'ROOT::VecOps::RVec<int> pxs; '
+                    'for (int bit : bits) '
+                    'pxs.push_back(calibration[bit]); '
+                    'return pxs;' % calibration) \
+            .Define('bxs', 'ROOT::VecOps::RVec<int>(pxs.size(), bx)')
+        events = events.Filter('bx != 0')
+
+        rc = RippleCounter()
+        hm = HitMap()
+        # Only used for the colors of the pixels, it needs no data
+        sd = SynchronousData.__new__(SynchronousData)
+
+        # Histograms of each MPA: ripples (pixels x shutters), counts per BX,
+        # hits per bit of the hit maps and counts per BX of each pixel (pixels
+        # x BX's)
+        booked = []
+        for idx_mpa in range(0, no_mpas):
+            mpa = 'mpa == %s' % idx_mpa
+
+            name = 'ripples_per_shutter_pxs_MPA%s' % idx_mpa
+            rs = ripples.Filter(mpa).Histo2D(
+                (name, name, no_pxs, 0, no_pxs, no_shutters, .5,
+                 no_shutters+.5), 'px', 'shutter_no', 'ripples')
+
+            name = 'counts_per_bx_MPA%s' % idx_mpa
+            bx = events.Filter(mpa).Histo1D((name, name, 100, 0, 100), 'bx')
+
+            name = 'hit_maps_bits_MPA%s' % idx_mpa
+            bits = words.Filter(mpa).Histo1D(
+                (name, name, HitMapDecoder.no_pxs, 0, HitMapDecoder.no_pxs),
+                'bits')
+
+            name = 'counts_per_bx_MPA%s_pxs' % idx_mpa
+            px_bx = sync.Filter(mpa).Histo2D(
+                (name, name, no_pxs, 0, no_pxs, 100, 0, 100), 'pxs', 'bxs')
+
+            booked.append((rs, bx, bits, px_bx))
+
+        # Keep the results, they own the histograms
+        for results in booked:
+            self._results.extend(results)
+
+        # Options as in the plotters
+        options_rs = {'x_title': 'Shutter', 'y_title': 'Ripple count'}
+        options_map = {'draw_option': 'COLZ|TEXT90'}
+        options_bx = {'x_title': 'BX', 'y_title': 'Event count',
+                      'logy': True}
+        options_px = dict(options_bx, min=.1, max=20000)
+
+        name_rs = 'ripples_per_shutter_px%s_MPA%s'
+        stack_rs = ROOT.THStack(name_rs % ('all', 'all'),
+                                name_rs % ('all', 'all'))
+        leg_rs = ROOT.TLegend(.9, .5, 1., .9)
+        stack_bx = ROOT.THStack('counts_per_bx_MPAall', 'counts_per_bx_MPAall')
+        leg_bx = ROOT.TLegend(.9, .5, 1., .9)
+        maps_merged = {}
+
+        histograms = []
+        for idx_mpa, (rs, bx, bits, px_bx) in enumerate(booked):
+
+            # Ripples vs. shutter of each pixel and of all pixels
+            rs = rs.GetValue()
+            for px in range(0, no_pxs):
+                histograms.append(('ripples_per_shutter', rs.ProjectionY(
+                    name_rs % (px, idx_mpa), px+1, px+1), options_rs))
+            h_mpa = rs.ProjectionY(name_rs % ('all', idx_mpa), 1, no_pxs)
+            histograms.append(('ripples_per_shutter', h_mpa, options_rs))
+            # The stacks get colored copies, the plots of the MPAs are drawn
+            # without colors like in the plotters
+            h_mpa = h_mpa.Clone()
+            h_mpa.SetFillColor(rc._get_fill_color(idx_mpa))
+            stack_rs.Add(h_mpa)
+            leg_rs.AddEntry(h_mpa, 'MPA%s' % idx_mpa, 'f')
+
+            # Ripple map filled with the ripples of each pixel like in the
+            # plotter, and sum of the maps of all MPAs
+            ripples_px = get_buffers(rs.ProjectionX())[0][1:no_pxs+1]
+            x, y = rc._get_geometry(idx_mpa).get_xy(range(0, no_pxs))
+            map_mpa = rc._create_map('ripples_maps_MPA%s' % idx_mpa)
+            Accumulator(map_mpa).fill(x, y, ripples_px).flush()
+            histograms.append(('ripples_maps', map_mpa, options_map))
+            self._add_merged(maps_merged, 'ripples_maps', map_mpa)
+
+            # Hit map filled with the hits of each pixel like in the plotter,
+            # the pixels are counted from the beginning of the hit map
+            px_hits = get_buffers(bits.GetValue())[0][1:no_pxs+1][::-1]
+            x, y = hm._get_geometry(idx_mpa).get_xy(range(0, no_pxs))
+            map_mpa = hm._create_map('hit_maps_MPA%s' % idx_mpa)
+            Accumulator(map_mpa).fill(x, y, px_hits, px_hits).flush()
+            histograms.append(('hit_maps', map_mpa, options_map))
+            self._add_merged(maps_merged, 'hit_maps', map_mpa)
+
+            # Counts per BX
+            bx = bx.GetValue()
+            histograms.append(('counts_per_bx', bx, options_bx))
+            bx = bx.Clone()
+            bx.SetLineColor(rc._get_fill_color(idx_mpa))
+            stack_bx.Add(bx)
+            leg_bx.AddEntry(bx, 'MPA%s' % idx_mpa, 'l')
+
+            # Counts per BX of each pixel, the pixels with hits are stacked
+            px_bx = px_bx.GetValue()
+            name = 'counts_per_bx_MPA%s_px%s'
+            stack_px = ROOT.THStack(name % (idx_mpa, 'all'),
+                                    name % (idx_mpa, 'all'))
+            leg_px = ROOT.TLegend(.9, .1, 1., .9)
+            for px in range(0, no_pxs):
+                histogram = px_bx.ProjectionY(name % (idx_mpa, px), px+1,
+                                              px+1)
+                histogram.SetLineColor(sd._get_color(px))
+                histograms.append(('counts_per_px_bx', histogram,
+                                   options_px))
+                if histogram.GetMaximum() != 0.:
+                    stack_px.Add(histogram)
+                    leg_px.AddEntry(histogram, 'px%s' % px, 'l')
+            if stack_px.GetMaximum() != 0.:
+                histograms.append(('counts_per_px_bx', stack_px,
+                                   dict(options_px, leg=leg_px,
+                                        draw_option='nostack')))
+
+        histograms.append(('ripples_per_shutter', stack_rs,
+                           dict(options_rs, leg=leg_rs)))
+        for family in ['ripples_maps', 'hit_maps']:
+            histograms.append((family, maps_merged[family], options_map))
+        histograms.append(('counts_per_bx', stack_bx,
+                           dict(options_bx, leg=leg_bx,
+                                draw_option='nostack')))
+
+        return histograms
+
+    def plot(self, path):
+
+        """ Plot the histograms of get_histograms() to the directories of
+        the plot families in path, and the maps of all MPAs on one canvas.
+        """
+
+        families = ['ripples_per_shutter', 'ripples_maps', 'counts_per_bx',
+                    'hit_maps', 'counts_per_px_bx']
+        for family in families:
+            system('mkdir -p %s/%s' % (path, family))
+
+        histograms = self.get_histograms()
+        for family, histogram, options in histograms:
+            Renderer.render(histogram, '%s/%s/%s.pdf'
+                            % (path, family, histogram.GetName()), **options)
+
+        # Maps of the MPAs with the same Z range, drawn after their own plots
+        # since this changes them
+        for family, plotter in [('ripples_maps', RippleCounter()),
+                                ('hit_maps', HitMap())]:
+            maps = [histogram for family_map, histogram, _ in histograms
+                    if family_map == family
+                    and histogram.GetName() != '%s_MPAmerged' % family]
+            z_max = max(map.GetMaximum() for map in maps)
+            plotter._plot_map_all(maps, '%s/%s' % (path, family),
+                                  '%s_MPA%%s' % family, z_max)
+
+    @staticmethod
+    def _add_merged(maps_merged, family, map_mpa):
+
+        """ Add map of an MPA to the merged map of family in the dictionary
+        maps_merged, which is created from the first map. """
+
+        if family not in maps_merged:
+            name = '%s_MPAmerged' % family
+            maps_merged[family] = map_mpa.Clone(name)
+            maps_merged[family].SetTitle(name)
+            return
+
+        maps_merged[family].Add(map_mpa)
+
+    def _get_events(self, MPAs_bx, MPAs_hm):
+
+        """ Return columns of the events tree as list of (name, array). """
+
+        mpa, shutter, slot, bx, hit_map = [], [], [], [], []
+        for idx_mpa, (MPA_bx, MPA_hm) in enumerate(zip(MPAs_bx, MPAs_hm)):
+            data_bx = MPA_bx.get_data()
+            data_hm = MPA_hm.get_data()
+            if data_bx.shape != data_hm.shape:
+                raise IndexError('Bunch crossing data %s and hit map data %s '
+                                 'of MPA %s have different shapes.'
+                                 % (data_bx.shape, data_hm.shape, idx_mpa))
+
+            shutters, slots = np.indices(data_bx.shape)
+            mpa.append(np.full(data_bx.size, idx_mpa, dtype=np.int32))
+            shutter.append(shutters.ravel())
+            slot.append(slots.ravel())
+            bx.append(data_bx.ravel())
+            hit_map.append(data_hm.ravel())
+
+        return [('mpa', self._concatenate(mpa, np.int32)),
+                ('shutter', self._concatenate(shutter, np.int32)),
+                ('slot', self._concatenate(slot, np.int32)),
+                ('bx', self._concatenate(bx, np.int32)),
+                ('hit_map', self._concatenate(hit_map, np.int64))]
+
+    def _get_ripples(self, MPAs_rc):
+
+        """ Return columns of the ripples tree as list of (name, array). """
+
+        mpa, shutter, px, ripples = [], [], [], []
+        for idx_mpa, MPA_rc in enumerate(MPAs_rc):
+            data = MPA_rc.get_data()
+            shutters, pxs = np.indices(data.shape)
+            mpa.append(np.full(data.size, idx_mpa, dtype=np.int32))
+            shutter.append(shutters.ravel())
+            px.append(pxs.ravel())
+            ripples.append(data.ravel())
+
+        return [('mpa', self._concatenate(mpa, np.int32)),
+                ('shutter', self._concatenate(shutter, np.int32)),
+                ('px', self._concatenate(px, np.int32)),
+                ('ripples', self._concatenate(ripples, np.int64))]
+
+    @staticmethod
+    def _concatenate(arrays, dtype):
+
+        """ Return arrays concatenated to one contiguous array of dtype. """
+
+        return np.ascontiguousarray(np.concatenate(
+            arrays + [np.zeros(0, dtype=dtype)]).astype(dtype))
+
+    @staticmethod
+    def _from_numpy(columns):
+
+        """ Return RDataFrame reading the dictionary of numpy arrays
+        columns. """
+
+        RDF = get_root().RDF
+        # Renamed in ROOT 6.28
+        if hasattr(RDF, 'FromNumpy'):
+            return RDF.FromNumpy(columns)
+        return RDF.MakeNumpyDataFrame(columns)
@@ -0,0 +1,95 @@
+#!/usr/bin/env python2
+
+""" Author: Basil Schneider <basil.schneider@cern.ch>
+Scans over DAQ directories, e.g. delay or threshold scans. """
+
+import re
+from glob import glob
+from os.path import basename, join
+from ScanLoader import imap_bounded
+import Settings
+
+def _format_delay(value):
+
+    """ Return legend entry of delay in ns. """
+
+    if value < 1000:
+        return 'delay %g ns' % value
+    return 'delay %g us' % (value/1000.)
+
+# Rules to get the scan variable from the directory name: regular expression
+# with the value as first group, and function returning the legend entry of
+# a value
+rules = {'delay': (r'_trigdelay([0-9.e+]+)ns$', _format_delay),
+         'threshold': (r'_thr([0-9.e+]+)', lambda value:
+                       'threshold %g' % value),
+         'shutter_duration': (r'_shdur([0-9.e+]+)', lambda value:
+                              'shutter duration %g' % value),
+         'position': (r'_X([0-9.e+]+)', lambda value: 'X %g' % value)}
+
+class Scan(object):
+
+    """ Scan over DAQ directories. The directories are found with a glob
+    pattern of their names, the value of the scan variable is taken from the
+    directory name with a rule (see rules). The points of the scan are sorted
+    by the value of the scan variable, each value can only appear once.
+
+    The points are loaded in parallel with the settings of Settings (jobs
+    and max_in_flight). """
+
+    def __init__(self, pattern, variable, path_daqlogs='../daqlogs'):
+
+        """ Initialize instances. variable is a key of rules. """
+
+        if variable not in rules:
+            raise KeyError('There is no rule for the scan variable %s, choose '
+                           'from %s.' % (variable, ', '.join(sorted(rules))))
+        regex, self._format = rules[variable]
+        regex = re.compile(regex)
+
+        self._points = []
+        for path_log in glob(join(path_daqlogs, pattern)):
+            match = regex.search(basename(path_log))
+            if match is None:
+                raise ValueError('The directory %s does not contain a value '
+                                 'of the scan variable %s.'
+                                 % (path_log, variable))
+            self._points.append((float(match.group(1)), path_log))
+        self._points.sort()
+
+        for (value, path_log), (value_next, path_next) \
+                in zip(self._points, self._points[1:]):
+            if value == value_next:
+                raise ValueError('The directories %s and %s have the same '
+                                 'value %g of the scan variable %s.'
+                                 % (path_log, path_next, value, variable))
+
+    def get_values(self):
+
+        """ Return list of values of the scan variable. """
+
+        return [value for value, _ in self._points]
+
+    def get_paths(self):
+
+        """ Return list of directories. """
+
+        return [path_log for _, path_log in self._points]
+
+    def get_labels(self):
+
+        """ Return list of legend entries of the points. """
+
+        return [self._format(value) for value, _ in self._points]
+
+    def load(self, function):
+
+        """ Return list of function(path) for all directories (in the order of
+        the points), computed in parallel if jobs > 1. function has to be
+        defined at module level, so it can be sent to the worker processes.
+        """
+
+        return list(imap_bounded(function, [(path_log,) for path_log
+                                            in self.get_paths()],
+                                 Settings.get_jobs(),
+                                 Settings.get_max_in_flight()))
@@ -0,0 +1,129 @@
+#!/usr/bin/env python2
+
+""" Author: Basil Schneider <basil.schneider@cern.ch>
+Load the logfiles of the directories of a scan in parallel. """
+
+from itertools import izip
+from os.path import basename, normpath
+from multiprocessing import Pool
+import numpy as np
+from RippleCounter import RippleCounter
+from BunchCrossing import BunchCrossing
+from HitMap import HitMap
+from SyncEvents import SyncEvents
+from EventTable import EventTable
+import Settings
+
+def imap_bounded(function, args, jobs, max_in_flight):
+
+    """ Return generator of function(*arg) for arg in args, in this order.
+    With jobs > 1, the calls run in a pool of jobs worker processes, with at
+    most max_in_flight calls submitted and not yet returned. """
+
+    if jobs <= 1:
+        for arg in args:
+            yield function(*arg)
+        return
+
+    pool = Pool(jobs)
+    try:
+        pending = []
+        for arg in args:
+            while len(pending) >= max(max_in_flight, 1):
+                yield pending.pop(0).get()
+            pending.append(pool.apply_async(function, arg))
+        while pending:
+            yield pending.pop(0).get()
+    finally:
+        pool.terminate()
+        pool.join()
+
+def get_coordinates(path_log, microstep):
+
+    """ Return position and delay of a scan directory, taken from its name
+    (not from the names of its parent directories). This is hardcoded for
+    now. """
+
+    name = basename(normpath(path_log))
+
+    # Find the x position
+    #cor_x = int(name.split('_')[-1].lstrip('x')) + 600
+    cor_x = int(name.split('X')[1].split('_')[0]) - 917000
+    cor_x *= microstep
+
+    # Find the delay
+    delay = float(name.split('to')[1].split('ns')[0])
+
+    return cor_x, delay
+
+def load(path_log, microstep):
+
+    """ Read the logfiles of one scan directory and return its position,
+    delay, the table rows of its synchronous hits (log index 0) and its
+    asynchronous hits (MPAs x pixels). """
+
+    # Need timestamp from path, this method is not foolproof!
+    name = basename(normpath(path_log))
+    path_timestamp = name[name.find('daqout'):].split('_')[3]
+    cor_x, delay = get_coordinates(path_log, microstep)
+
+    hm = HitMap()
+    hm.read_data_raw('%s/log_%s.log_memory_data' % (path_log, path_timestamp))
+    bx = BunchCrossing()
+    bx.read_data_raw('%s/log_%s.log_memory_bx' % (path_log, path_timestamp))
+
+    # Join hit maps and bunch crossings
+    events = SyncEvents(bx.get_mpas(), hm.get_mpas())
+    rows = EventTable.get_rows(0, cor_x, delay, events)
+    del hm, bx
+
+    rc = RippleCounter()
+    rc.read_data_raw('%s/log_%s.log_counter' % (path_log, path_timestamp))
+    hits_async = np.array([MPA.get_no_hits() for MPA in rc.get_mpas()],
+                          dtype=np.int64)
+
+    return cor_x, delay, rows, hits_async
+
+class ScanLoader(object):
+
+    """ Load scan directories, each in a worker process of a pool if jobs > 1.
+    Only the compact results of load() are sent back, not the MPA objects.
+    The directories are submitted in the order of their scan coordinates
+    (position, delay) and the results returned in the same order, while the
+    workers already read the next directories. At most max_in_flight
+    directories are submitted and not yet returned, which limits the memory
+    needed.
+
+    jobs and max_in_flight are taken from Settings (defaults from the
+    environment variables MPA_JOBS and MPA_IN_FLIGHT). """
+
+    def __init__(self, microstep):
+
+        """ Initialize instances. """
+
+        self._microstep = microstep
+
+    def sort(self, paths_log):
+
+        """ Return scan directories sorted by scan coordinates. """
+
+        return sorted(paths_log, key=lambda path_log:
+                      (get_coordinates(path_log, self._microstep), path_log))
+
+    def load(self, paths_log):
+
+        """ Return generator of (path, position, delay, rows, asynchronous
+        hits) for the scan directories in the order of sort(). The log index
+        of the rows is the index in this order. """
+
+        paths_log = self.sort(paths_log)
+        results = imap_bounded(load, [(path_log, self._microstep)
+                                      for path_log in paths_log],
+                               Settings.get_jobs(),
+                               Settings.get_max_in_flight())
+
+        for idx_log, (path_log, result) in enumerate(izip(paths_log,
+                                                          results)):
+            cor_x, delay, rows, hits_async = result
+            rows['log'] = idx_log
+            yield path_log, cor_x, delay, rows, hits_async
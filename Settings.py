@@ -0,0 +1,77 @@
+#!/usr/bin/env python2
+
+""" Author: Basil Schneider <basil.schneider@cern.ch>
+Settings shared by the modules, read from the environment once.
+
+The number of worker processes (MPA_JOBS) is used by all parallel parts
+(Plotter, Renderer, ScanLoader, Scan), so setting it with set_jobs() (e.g.
+with --jobs of the scripts) changes it everywhere. """
+
+from os import environ
+from warnings import warn
+
+def _get_int(name, default):
+
+    """ Return value of the environment variable name as integer, default if
+    it is not set or not an integer. """
+
+    value = environ.get(name)
+    if value is None:
+        return default
+
+    try:
+        return int(value)
+    except ValueError:
+        warn('Ignoring %s=%r, it is not an integer. Using %s instead.'
+             % (name, value, default))
+        return default
+
+# Number of worker processes
+_jobs = _get_int('MPA_JOBS', 1)
+
+# Number of scan directories submitted to the workers and not yet returned
+_max_in_flight = _get_int('MPA_IN_FLIGHT', 4)
+
+# Number of threads of RDataFrame, 0 for all cores
+_threads = _get_int('MPA_THREADS', 0)
+
+def get_jobs():
+
+    """ Return number of worker processes. """
+
+    return _jobs
+
+def set_jobs(jobs):
+
+    """ Set number of worker processes. """
+
+    global _jobs
+    _jobs = jobs
+
+def get_max_in_flight():
+
+    """ Return number of scan directories submitted to the workers and not
+    yet returned. """
+
+    return _max_in_flight
+
+def set_max_in_flight(max_in_flight):
+
+    """ Set number of scan directories submitted to the workers and not yet
+    returned. """
+
+    global _max_in_flight
+    _max_in_flight = max_in_flight
+
+def get_threads():
+
+    """ Return number of threads of RDataFrame (0 for all cores). """
+
+    return _threads
+
+def set_threads(threads):
+
+    """ Set number of threads of RDataFrame (0 for all cores). """
+
+    global _threads
+    _threads = threads
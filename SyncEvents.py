@@ -0,0 +1,93 @@
+#!/usr/bin/env python2
+
+""" Author: Basil Schneider <basil.schneider@cern.ch>
+Sparse events of the MPA Light synchronous readout. """
+
+from itertools import izip
+import numpy as np
+
+class SyncEvents(object):
+
+    """ Events of the synchronous readout of all MPAs, built once from the
+    bunch crossing and hit map data. There is one event per occupied memory
+    slot, i.e. per slot with both a bunch crossing and a hit map different
+    from 0. The bunch crossing and the hit map of an event are taken from the
+    same memory slot of the same shutter, so a 0 in one of the memories does
+    not shift the other one.
+
+    The events are a structured array with the fields mpa, shutter, slot
+    (memory slot), bx (bunch crossing) and hit_map (hit map word, see
+    HitMapDecoder), sorted by MPA, shutter and slot. """
+
+    dtype = np.dtype([('mpa', np.int8), ('shutter', np.int32),
+                      ('slot', np.int16), ('bx', np.int32),
+                      ('hit_map', np.int64)])
+
+    def __init__(self, MPAs_bx, MPAs_hm):
+
+        """ Initialize instances from the MPA objects of a BunchCrossing and
+        a HitMap object. """
+
+        # Check that both lists have same length
+        if len(MPAs_bx) != len(MPAs_hm):
+            raise IndexError('BunchCrossing and HitMap objects have different '
+                             'number of MPAs.')
+
+        parts = [np.zeros(0, dtype=self.dtype)]
+        for idx_mpa, (MPA_bx, MPA_hm) in enumerate(zip(MPAs_bx, MPAs_hm)):
+            if MPA_bx.get_no_shutters() != MPA_hm.get_no_shutters():
+                raise IndexError('Bunch crossing data and hit map data of MPA '
+                                 '%s have different numbers of shutters.'
+                                 % idx_mpa)
+
+            # Join in chunks of shutters, the data can be larger than memory
+            first_shutter = 0
+            for bx_data, hm_data in izip(MPA_bx.iter_chunks(),
+                                         MPA_hm.iter_chunks()):
+                parts.append(self._join(idx_mpa, first_shutter, bx_data,
+                                        hm_data))
+                first_shutter += len(bx_data)
+        self._events = np.concatenate(parts)
+        self._events.flags.writeable = False
+
+        # Index of first event of each MPA
+        self._offsets = np.searchsorted(self._events['mpa'],
+                                        np.arange(len(MPAs_bx)+1))
+
+    def get_events(self, idx_mpa=None):
+
+        """ Return (read-only) events of one MPA or of all MPAs. The events
+        of one MPA are a view, not a copy. """
+
+        if idx_mpa is None:
+            return self._events
+
+        return self._events[self._offsets[idx_mpa]:self._offsets[idx_mpa+1]]
+
+    def get_no_mpas(self):
+
+        """ Return number of MPAs. """
+
+        return len(self._offsets) - 1
+
+    def _join(self, idx_mpa, first_shutter, bx_data, hm_data):
+
+        """ Return events of shutters of one MPA. bx_data and hm_data are 2d
+        arrays (shutters x memory slots), starting with shutter first_shutter.
+        """
+
+        if bx_data.shape != hm_data.shape:
+            raise IndexError('Bunch crossing data %s and hit map data %s of '
+                             'MPA %s have different shapes.'
+                             % (bx_data.shape, hm_data.shape, idx_mpa))
+
+        shutters, slots = np.nonzero((bx_data != 0) & (hm_data != 0))
+
+        events = np.zeros(len(shutters), dtype=self.dtype)
+        events['mpa'] = idx_mpa
+        events['shutter'] = shutters + first_shutter
+        events['slot'] = slots
+        events['bx'] = bx_data[shutters, slots]
+        events['hit_map'] = hm_data[shutters, slots]
+
+        return events
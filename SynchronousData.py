@@ -5,10 +5,11 @@ Simple plotting script to visualize the output of the MPA Light synchronous
 readout (correlate hit maps with bunch crossing data). """
 
 from os import system
-from ROOT import TH1F, THStack, TLegend
-from ROOT import kRed, kPink, kMagenta, kViolet, kBlue, kAzure
-from ROOT import kCyan, kTeal, kGreen, kSpring, kYellow, kOrange
 from Plotter import Plotter
+from Accumulator import Accumulator
+from LazyRoot import get_root
+from SyncEvents import SyncEvents
+import HitMapDecoder
 
 class SynchronousData(Plotter):
 
@@ -19,62 +20,52 @@ class SynchronousData(Plotter):
 
         """ Initialize class instances. """
 
-        # Get MPA lists from BunchCrossing and HitMap objects
-        self._MPAs_bx = bx.get_mpas()
-        self._MPAs_hm = hm.get_mpas()
+        # Join bunch crossings and hit maps of BunchCrossing and HitMap
+        # objects
+        self._events = SyncEvents(bx.get_mpas(), hm.get_mpas())
 
-        # Check that both lists have same length
-        if len(self._MPAs_bx) != len(self._MPAs_hm):
-            raise IndexError('BunchCrossing and HitMap objects have different '
-                             'number of MPAs.')
+    def get_events(self):
+
+        """ Return SyncEvents object. """
+
+        return self._events
 
     def plot_cts_bx_px(self, path):
 
         """ Plots counts vs. bunch crossing separate in each pixel. """
 
+        ROOT = get_root()
+
         system('mkdir -p %s' % path)
         name = 'counts_per_bx_MPA%s_px%s'
         x_title = 'BX'
         y_title = 'Event count'
 
         # Create THStack and its TLegend
-        stack = THStack(name % ('all', 'all'), name % ('all', 'all'))
-        leg = TLegend(.9, .5, 1., .9)
+        stack = ROOT.THStack(name % ('all', 'all'), name % ('all', 'all'))
+        leg = ROOT.TLegend(.9, .5, 1., .9)
 
-        for idx_mpa in range(0, len(self._MPAs_bx)):
+        # Counts of each pixel of each MPA (in parallel with jobs > 1)
+        accs_mpa = self._map_mpas('_fill_cts_bx_px',
+                                  self._events.get_no_mpas())
+
+        for idx_mpa, accs_px in enumerate(accs_mpa):
 
             # Create THStack and its TLegend
-            stack_mpa = THStack(name % (idx_mpa, 'all'), name % (idx_mpa, 'all'))
-            leg_mpa = TLegend(.9, .1, 1., .9)
+            stack_mpa = ROOT.THStack(name % (idx_mpa, 'all'),
+                                     name % (idx_mpa, 'all'))
+            leg_mpa = ROOT.TLegend(.9, .1, 1., .9)
 
             # List with 48 histograms
             histos = []
             for idx_px in range(0, self._no_pxs_x*self._no_pxs_y):
-                histo = TH1F(name % (idx_mpa, idx_px),
-                             name % (idx_mpa, idx_px), 100, 0, 100)
+                histo = ROOT.TH1F(name % (idx_mpa, idx_px),
+                                  name % (idx_mpa, idx_px), 100, 0, 100)
                 histo.SetLineColor(self._get_color(idx_px))
                 histos.append(histo)
 
-
-            # Remove all 0's from lists
-            for idx_shutter in range(0, len(self._MPAs_bx[idx_mpa].get_no_hits_shutter())):
-                # Remove all 0's from the lists
-                MPA_bx = [val for val in
-                          self._MPAs_bx[idx_mpa].get_no_hits_shutter()[idx_shutter]
-                          if val != 0]
-                MPA_hm = [val for val in
-                          self._MPAs_hm[idx_mpa].get_no_hits_shutter()[idx_shutter]
-                          if val != 0]
-
-                # Convert hit maps to list of pixels with hits (separately for
-                # each hit map)
-                MPA_ph = []
-                for hit_map in MPA_hm:
-                    MPA_ph.append(self._convert(hit_map))
-
-                for idx_hm, MPA_ph_bxs in enumerate(MPA_ph):
-                    for MPA_ph_bx in MPA_ph_bxs:
-                        histos[MPA_ph_bx].Fill(MPA_bx[idx_hm])
+            for histo, acc_px in zip(histos, accs_px):
+                self._add_histo(histo, acc_px)
 
             # Loop over all histos
             for idx_px, histo in enumerate(histos):
@@ -95,128 +86,123 @@ class SynchronousData(Plotter):
                                  x_title, y_title, leg_mpa, logy=True,
                                  min=.1, max=20000, draw_option='nostack')
 
-    def _convert(self, MPA_hm):
-
-        """ Convert hit map to list of pixels with hits. """
-
-        # TODO: Merge with same method in MPA class
+    def _fill_cts_bx_px(self, idx_mpa):
 
-        MPA_ph = []
-        # Reverse loop through hit map digit by digit
-        for idx, px in enumerate(str(MPA_hm)[::-1]):
-            if px == '1':
-                MPA_ph.append(self._get_coordinate(idx))
+        """ Return list of accumulators of the counts vs. bunch crossing of
+        each pixel of one MPA (see _map_mpas()). """
 
-        return MPA_ph
+        # Bunch crossings and hit maps belonging together
+        events = self._events.get_events(idx_mpa)
 
-    def _get_coordinate(self, px):
+        # Convert hit maps to pixels with hits
+        MPA_ph = HitMapDecoder.decode_pixels(events['hit_map'])
 
-        """ Get coordinate of pixel, since geometries of hit map and
-        calibration differ. """
+        accs_px = []
+        for idx_px in range(0, self._no_pxs_x*self._no_pxs_y):
+            accs_px.append(Accumulator.from_axes([(100, 0, 100)])
+                           .fill(events['bx'][MPA_ph[:, idx_px]]))
 
-        # TODO: Merge with same method in MPA class
-
-        if px in range(16, 32):
-            return px
-        return (47 - px)
+        return accs_px
 
     def _get_color(self, px):
 
         """ Return color for specific pixel. """
 
+        ROOT = get_root()
+
         if px == 0:
-            return kRed-7
+            return ROOT.kRed-7
         if px == 1:
-            return kPink-7
+            return ROOT.kPink-7
         if px == 2:
-            return kMagenta-7
+            return ROOT.kMagenta-7
         if px == 3:
-            return kViolet-7
+            return ROOT.kViolet-7
         if px == 4:
-            return kBlue-7
+            return ROOT.kBlue-7
         if px == 5:
-            return kAzure-7
+            return ROOT.kAzure-7
         if px == 6:
-            return kCyan-7
+            return ROOT.kCyan-7
         if px == 7:
-            return kTeal-7
+            return ROOT.kTeal-7
         if px == 8:
-            return kGreen-7
+            return ROOT.kGreen-7
         if px == 9:
-            return kSpring-7
+            return ROOT.kSpring-7
         if px == 10:
-            return kYellow-7
+            return ROOT.kYellow-7
         if px == 11:
-            return kOrange-7
+            return ROOT.kOrange-7
         if px == 12:
-            return kRed-3
+            return ROOT.kRed-3
         if px == 13:
-            return kPink-3
+            return ROOT.kPink-3
         if px == 14:
-            return kMagenta-3
+            return ROOT.kMagenta-3
         if px == 15:
-            return kViolet-3
+            return ROOT.kViolet-3
         if px == 16:
-            return kBlue-3
+            return ROOT.kBlue-3
         if px == 17:
-            return kAzure-3
+            return ROOT.kAzure-3
         if px == 18:
-            return kCyan-3
+            return ROOT.kCyan-3
         if px == 19:
-            return kTeal-3
+            return ROOT.kTeal-3
         if px == 20:
-            return kGreen-3
+            return ROOT.kGreen-3
         if px == 21:
-            return kSpring-3
+            return ROOT.kSpring-3
         if px == 22:
-            return kYellow-3
+            return ROOT.kYellow-3
         if px == 23:
-            return kOrange-3
+            return ROOT.kOrange-3
         if px == 24:
-            return kRed+2
+            return ROOT.kRed+2
         if px == 25:
-            return kPink+2
+            return ROOT.kPink+2
         if px == 26:
-            return kMagenta+2
+            return ROOT.kMagenta+2
         if px == 27:
-            return kViolet+2
+            return ROOT.kViolet+2
         if px == 28:
-            return kBlue+2
+            return ROOT.kBlue+2
         if px == 29:
-            return kAzure+2
+            return ROOT.kAzure+2
         if px == 30:
-            return kCyan+2
+            return ROOT.kCyan+2
         if px == 31:
-            return kTeal+2
+            return ROOT.kTeal+2
         if px == 32:
-            return kGreen+2
+            return ROOT.kGreen+2
         if px == 33:
-            return kSpring+2
+            return ROOT.kSpring+2
         if px == 34:
-            return kYellow+2
+            return ROOT.kYellow+2
         if px == 35:
-            return kOrange+2
+            return ROOT.kOrange+2
         if px == 36:
-            return kRed+3
+            return ROOT.kRed+3
         if px == 37:
-            return kPink+3
+            return ROOT.kPink+3
         if px == 38:
-            return kMagenta+3
+            return ROOT.kMagenta+3
         if px == 39:
-            return kViolet+3
+            return ROOT.kViolet+3
         if px == 40:
-            return kBlue+3
+            return ROOT.kBlue+3
         if px == 41:
-            return kAzure+3
+            return ROOT.kAzure+3
         if px == 42:
-            return kCyan+3
+            return ROOT.kCyan+3
         if px == 43:
-            return kTeal+3
+            return ROOT.kTeal+3
         if px == 44:
-            return kGreen+3
+            return ROOT.kGreen+3
         if px == 45:
-            return kSpring+3
+            return ROOT.kSpring+3
         if px == 46:
-            return kYellow+3
+            return ROOT.kYellow+3
         if px == 47:
-            return kOrange+3
+            return ROOT.kOrange+3
@@ -0,0 +1,161 @@
+#!/usr/bin/env python2
+
+""" Author: Basil Schneider <basil.schneider@cern.ch>
+Minimal task graph with make-like up-to-date checks. """
+
+from os import listdir, makedirs, remove
+from os.path import dirname, getmtime, isdir, isfile, join
+from Profiler import Profiler
+
+class Task(object):
+
+    """ A task has an action, which is called with the results of the tasks
+    it depends on. Tasks with outputs (files or directories) are skipped if
+    all outputs exist and their stamp file, written after the task finished,
+    is newer than all inputs and records the same mode (e.g. the output
+    format). A task interrupted before writing its stamp is run again. Tasks
+    without outputs (e.g. reading data) run whenever a task needing them
+    runs. """
+
+    def __init__(self, name, action, deps=(), inputs=(), outputs=(),
+                 stamp=None):
+
+        """ Initialize instances. """
+
+        self.name = name
+        self.action = action
+        self.deps = list(deps)
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.stamp = stamp
+
+    def is_up_to_date(self, mode=''):
+
+        """ Return True if the task has outputs and they all exist, and its
+        stamp exists, records mode and is newer than all inputs. """
+
+        if not self.outputs or self.stamp is None or not isfile(self.stamp):
+            return False
+
+        for output in self.outputs:
+            if not self._get_mtimes(output):
+                return False
+
+        with open(self.stamp) as f_stamp:
+            if f_stamp.read() != mode:
+                return False
+
+        mtimes_in = []
+        for path in self.inputs:
+            mtimes_in.extend(self._get_mtimes(path))
+
+        return not mtimes_in or getmtime(self.stamp) > max(mtimes_in)
+
+    def remove_stamp(self):
+
+        """ Remove stamp, the task is out of date until write_stamp(). """
+
+        if self.stamp is not None and isfile(self.stamp):
+            remove(self.stamp)
+
+    def write_stamp(self, mode=''):
+
+        """ Write stamp recording mode, the task finished. """
+
+        if self.stamp is None:
+            return
+
+        if not isdir(dirname(self.stamp)):
+            makedirs(dirname(self.stamp))
+        with open(self.stamp, 'w') as f_stamp:
+            f_stamp.write(mode)
+
+    def _get_mtimes(self, path):
+
+        """ Return modification times of file, or of all files in directory.
+        """
+
+        if isfile(path):
+            return [getmtime(path)]
+        if isdir(path):
+            return [getmtime(join(path, name)) for name in listdir(path)
+                    if isfile(join(path, name))]
+        return []
+
+class TaskGraph(object):
+
+    """ Collection of tasks. Running a selection of tasks runs the tasks they
+    depend on first, each task at most once. mode is recorded in the stamps
+    of the tasks, tasks run with another mode are out of date. """
+
+    def __init__(self, mode=''):
+
+        """ Initialize instances. """
+
+        self._mode = mode
+        self._tasks = []
+        self._results = {}
+
+    def add(self, name, action, deps=(), inputs=(), outputs=(), stamp=None):
+
+        """ Add task, see Task. """
+
+        for dep in deps:
+            self._get_task(dep)
+        self._tasks.append(Task(name, action, deps, inputs, outputs, stamp))
+
+    def get_targets(self):
+
+        """ Return names of all tasks with outputs (in order of adding). """
+
+        return [task.name for task in self._tasks if task.outputs]
+
+    def run(self, targets, force=False, finish=None):
+
+        """ Run tasks with names in targets (in the order they were added),
+        unless they are up to date. finish is called after the tasks (e.g. to
+        wait until their files are written), then the stamps of the tasks run
+        are written. Return lists of tasks run and skipped. """
+
+        for target in targets:
+            self._get_task(target)
+
+        done = []
+        skipped = []
+        for task in self._tasks:
+            if task.name not in targets:
+                continue
+            if not force and task.is_up_to_date(self._mode):
+                skipped.append(task.name)
+                continue
+            task.remove_stamp()
+            self._run_task(task)
+            done.append(task.name)
+
+        if finish is not None:
+            finish()
+        for name in done:
+            self._get_task(name).write_stamp(self._mode)
+
+        return done, skipped
+
+    def _run_task(self, task):
+
+        """ Run task after the tasks it depends on, return its result. Each
+        task is a stage of the profile (see Profiler). """
+
+        if task.name not in self._results:
+            args = [self._run_task(self._get_task(dep)) for dep in task.deps]
+            with Profiler.stage(task.name):
+                self._results[task.name] = task.action(*args)
+
+        return self._results[task.name]
+
+    def _get_task(self, name):
+
+        """ Return task with name. """
+
+        for task in self._tasks:
+            if task.name == name:
+                return task
+        raise KeyError('There is no task %s.' % name)
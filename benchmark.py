@@ -0,0 +1,217 @@
+#!/usr/bin/env python2
+
+""" Author: Basil Schneider <basil.schneider@cern.ch>
+Time the stages of the plotting scripts on synthetic logfiles. """
+
+import json
+import platform
+from argparse import ArgumentParser
+from glob import glob
+from os import makedirs
+from os.path import abspath, dirname, join
+from shutil import rmtree
+from subprocess import check_call
+from sys import executable
+from tempfile import mkdtemp
+from time import strftime, time
+import numpy as np
+from ParseCache import ParseCache
+from Renderer import Renderer
+from RippleCounter import RippleCounter
+from BunchCrossing import BunchCrossing
+from HitMap import HitMap
+from SynchronousData import SynchronousData
+from ScanLoader import ScanLoader
+from EventTable import EventTable
+import HitMapDecoder
+from generate_logs import generate, get_dir_name
+import Settings
+
+class Benchmark(object):
+
+    """ Time stages of the plotting scripts and collect the results. The
+    fill stage is the time of the plot methods without the time spent in
+    Renderer.render() and Renderer.wait(), which is the render stage. """
+
+    def __init__(self, repeat=1):
+
+        """ Initialize instances. """
+
+        self._repeat = repeat
+        self._results = []
+        self._render_time = 0.
+
+        # Measure time spent rendering
+        render = Renderer.render
+        def render_timed(*args, **kwargs):
+            start = time()
+            render(*args, **kwargs)
+            self._render_time += time() - start
+        Renderer.render = staticmethod(render_timed)
+
+    def get_results(self):
+
+        """ Return list of results. """
+
+        return self._results
+
+    def time(self, benchmark, size, stage, function, *args):
+
+        """ Time function (fastest of repeat calls), add result and return the
+        return value of the last call. """
+
+        seconds = []
+        for _ in range(0, self._repeat):
+            start = time()
+            value = function(*args)
+            seconds.append(time() - start)
+        self._add(benchmark, size, stage, min(seconds))
+
+        return value
+
+    def time_plot(self, benchmark, size, function, *args):
+
+        """ Time plot method, split into fill and render stage. """
+
+        fill = []
+        render = []
+        for _ in range(0, self._repeat):
+            self._render_time = 0.
+            start = time()
+            function(*args)
+            start_wait = time()
+            Renderer.wait()
+            end = time()
+            render.append(self._render_time + end - start_wait)
+            fill.append(start_wait - start - self._render_time)
+        self._add(benchmark, size, 'fill', min(fill), function.__name__)
+        self._add(benchmark, size, 'render', min(render), function.__name__)
+
+    def _add(self, benchmark, size, stage, seconds, plot=''):
+
+        """ Add and print result. plot is the name of the plot method for
+        the fill and render stages. """
+
+        self._results.append({'benchmark': benchmark, 'size': size,
+                              'stage': stage, 'plot': plot,
+                              'seconds': seconds})
+        print '%-16s %8s %-7s %-21s %9.4f s' % (benchmark, size, stage, plot,
+                                                seconds)
+
+def run_plotters(bench, path, timestamp, size):
+
+    """ Time the stages of the plotters of plot.py for one directory. The
+    totals of the counters are kept while parsing, so they have no decode
+    stage of their own. """
+
+    log = '%s/log_%s.log_%%s' % (path, timestamp)
+    plots = '%s/plots/%%s/' % path
+
+    rc = RippleCounter()
+    bench.time('RippleCounter', size, 'parse',
+               lambda: RippleCounter().read_data_raw(log % 'counter'))
+    rc.read_data_raw(log % 'counter')
+    bench.time_plot('RippleCounter', size, rc.plot_ripples_shutter,
+                    plots % 'ripples_per_shutter')
+    bench.time_plot('RippleCounter', size, rc.plot_maps,
+                    plots % 'ripples_maps')
+
+    bx = BunchCrossing()
+    bench.time('BunchCrossing', size, 'parse',
+               lambda: BunchCrossing().read_data_raw(log % 'memory_bx'))
+    bx.read_data_raw(log % 'memory_bx')
+    bench.time_plot('BunchCrossing', size, bx.plot_cts_bx,
+                    plots % 'counts_per_bx')
+
+    hm = HitMap()
+    bench.time('HitMap', size, 'parse',
+               lambda: HitMap().read_data_raw(log % 'memory_data'))
+    hm.read_data_raw(log % 'memory_data')
+    # Hits per pixel (see MPA.get_pixel_hits()) and lists of pixels with
+    # hits (see MPA.convert_hm_to_px()), which would discard the data
+    bench.time('HitMap', size, 'decode',
+               lambda: [(HitMapDecoder.count_pixels(MPA.get_data()),
+                         HitMapDecoder.pixel_lists(MPA.get_data().reshape(-1)))
+                        for MPA in hm.get_mpas()])
+    bench.time_plot('HitMap', size, hm.plot_maps, plots % 'hit_maps')
+
+    sd = bench.time('SynchronousData', size, 'decode',
+                    SynchronousData, bx, hm)
+    bench.time_plot('SynchronousData', size, sd.plot_cts_bx_px,
+                    plots % 'counts_per_px_bx')
+
+def run_scan(bench, path, size, no_points, plot2):
+
+    """ Time loading a scan with no_points positions and, if plot2 is True,
+    the whole plot2.py script for it. """
+
+    path_daqlogs = join(path, 'daqlogs')
+    for idx in range(0, no_points):
+        timestamp = str(100+idx)
+        generate(join(path_daqlogs, get_dir_name(timestamp, 917000+100*idx)),
+                 timestamp, no_shutters=size, seed=idx)
+    paths_log = glob(join(path_daqlogs, 'daqout*'))
+
+    def load():
+        events = EventTable()
+        for _, _, _, rows, _ in ScanLoader(.047625).load(paths_log):
+            events.add_rows(rows)
+        return events.get_table()
+    bench.time('plot2', size, 'load', load)
+
+    if plot2:
+        path_run = join(path, 'run')
+        makedirs(path_run)
+        script = join(dirname(abspath(__file__)), 'plot2.py')
+        def run():
+            rmtree(join(path_run, 'noprocessing'), ignore_errors=True)
+            check_call([executable, script, '--no-cache', 'noprocessing'],
+                       cwd=path_run)
+        bench.time('plot2', size, 'total', run)
+
+if __name__ == '__main__':
+
+    parser = ArgumentParser(description='Time the stages of the plotting '
+                            'scripts on synthetic logfiles.')
+    parser.add_argument('--sizes', default='100,1000',
+                        help='comma separated numbers of shutters')
+    parser.add_argument('--scan-points', type=int, default=5,
+                        help='number of positions of the scan for plot2.py')
+    parser.add_argument('--no-plot2', action='store_true',
+                        help='do not time the whole plot2.py script')
+    parser.add_argument('--repeat', type=int, default=1,
+                        help='number of repetitions, the fastest one counts')
+    parser.add_argument('--output', default='benchmark.json',
+                        help='JSON file to write the results to')
+    parser.add_argument('--keep', action='store_true',
+                        help='keep the synthetic logfiles and plots')
+    args = parser.parse_args()
+
+    # Parsing is timed, not reading the cache
+    ParseCache.enabled = False
+
+    bench = Benchmark(args.repeat)
+    path = mkdtemp(prefix='mpa_benchmark_')
+    try:
+        for size in [int(size) for size in args.sizes.split(',')]:
+            timestamp = '111'
+            path_size = join(path, str(size), get_dir_name(timestamp))
+            generate(path_size, timestamp, no_shutters=size)
+            run_plotters(bench, path_size, timestamp, size)
+            run_scan(bench, join(path, str(size)), size, args.scan_points,
+                     not args.no_plot2)
+    finally:
+        if args.keep:
+            print 'Logfiles and plots are kept in %s.' % path
+        else:
+            rmtree(path, ignore_errors=True)
+
+    report = {'metadata': {'date': strftime('%Y-%m-%dT%H:%M:%S'),
+                           'python': platform.python_version(),
+                           'numpy': np.__version__,
+                           'machine': platform.node(),
+                           'jobs': Settings.get_jobs(),
+                           'repeat': args.repeat},
+              'results': bench.get_results()}
+    with open(args.output, 'w') as f_output:
+        json.dump(report, f_output, indent=1, sort_keys=True)
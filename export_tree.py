@@ -0,0 +1,42 @@
+#!/usr/bin/env python2
+
+""" Author: Basil Schneider <basil.schneider@cern.ch>
+Export the decoded data of MPA measurements to ROOT trees. """
+
+from argparse import ArgumentParser
+from ParseCache import ParseCache
+from RippleCounter import RippleCounter
+from BunchCrossing import BunchCrossing
+from HitMap import HitMap
+from RunTree import RunTree
+from plot import get_timestamp
+
+if __name__ == '__main__':
+
+    parser = ArgumentParser(description='Export the decoded data of MPA '
+                            'measurements to ROOT trees (see RunTree).')
+    parser.add_argument('path_logs', help='directory containing the logfiles')
+    parser.add_argument('--output', default=None,
+                        help='ROOT file to write (default run.root in the '
+                        'directory of the logfiles)')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='do not use the cache of parsed logfiles')
+    args = parser.parse_args()
+
+    if args.no_cache:
+        ParseCache.enabled = False
+
+    path_logs = args.path_logs
+    path_timestamp = get_timestamp(path_logs)
+
+    # Read in data from raw log files
+    rc = RippleCounter()
+    rc.read_data_raw('%s/log_%s.log_counter' % (path_logs, path_timestamp))
+    bx = BunchCrossing()
+    bx.read_data_raw('%s/log_%s.log_memory_bx' % (path_logs, path_timestamp))
+    hm = HitMap()
+    hm.read_data_raw('%s/log_%s.log_memory_data' % (path_logs, path_timestamp))
+
+    path_tree = args.output or '%s/run.root' % path_logs
+    RunTree(path_tree).write(rc, bx, hm)
+    print 'Wrote %s.' % path_tree
@@ -0,0 +1,106 @@
+#!/usr/bin/env python2
+
+""" Author: Basil Schneider <basil.schneider@cern.ch>
+Write synthetic logfiles of the MPA Light DAQ. """
+
+from argparse import ArgumentParser
+from os import makedirs
+from os.path import isdir
+import numpy as np
+
+# Number of MPAs, the plotters read logfiles of 6 MPAs only
+no_mpas = 6
+
+# Number of pixels and of memory slots of one MPA
+no_pxs = 48
+no_mems = 96
+
+def get_dir_name(timestamp, x=917000, delay=10):
+
+    """ Return name of a directory of the DAQ, the timestamp, position and
+    delay are found in it by plot.py and plot2.py. """
+
+    return 'daqout_default_noprocessing_%s_thr90_X%s_to%sns' % (timestamp, x,
+                                                               delay)
+
+def generate(path, timestamp, no_shutters=100, occupancy=.05, slots=2.,
+             bx_mean=10., bx_width=2., bx_noise=.1, counts=20., seed=0):
+
+    """ Write the logfiles log_<timestamp>.log_counter, .log_memory_bx and
+    .log_memory_data to path. Each logfile has one line per shutter and MPA,
+    the lines of the MPAs are interleaved.
+
+    In each shutter and MPA, the number of occupied memory slots is Poisson
+    distributed with mean slots. Each occupied slot has a bunch crossing,
+    normally distributed around bx_mean (with a fraction bx_noise uniformly
+    distributed up to 100 instead), and a hit map in which each pixel has a
+    hit with probability occupancy (at least one pixel per hit map). Unused
+    slots are 0. The ripple counters are Poisson distributed with mean
+    counts. """
+
+    random = np.random.RandomState(seed)
+    no_lines = no_shutters*no_mpas
+
+    if not isdir(path):
+        makedirs(path)
+    name = '%s/log_%s.log_%%s' % (path, timestamp)
+
+    # Ripple counters, 48 pixels per line
+    counter = random.poisson(counts, (no_lines, no_pxs))
+    np.savetxt(name % 'counter', counter, fmt='%d')
+
+    # Occupied memory slots are the first ones of each line
+    no_slots = np.minimum(random.poisson(slots, no_lines), no_mems)
+    occupied = np.arange(no_mems) < no_slots[:, np.newaxis]
+    no_occupied = occupied.sum()
+
+    # Bunch crossings
+    bx = np.zeros((no_lines, no_mems), dtype=np.int64)
+    bxs = np.rint(random.normal(bx_mean, bx_width, no_occupied))
+    noise = random.uniform(size=no_occupied) < bx_noise
+    bxs[noise] = random.randint(1, 100, noise.sum())
+    bx[occupied] = np.clip(bxs, 1, 99)
+    np.savetxt(name % 'memory_bx', bx, fmt='%d')
+
+    # Hit maps, written as numbers of 0's and 1's, the last digit is pixel 0
+    hits = random.uniform(size=(no_occupied, no_pxs)) < occupancy
+    hits[np.arange(no_occupied), random.randint(0, no_pxs, no_occupied)] = True
+    digits = np.where(hits[:, ::-1], '1', '0')
+    hit_maps = np.zeros((no_lines, no_mems), dtype='S%s' % no_pxs)
+    hit_maps[:] = '0'
+    hit_maps[occupied] = [''.join(row).lstrip('0') for row in digits]
+    with open(name % 'memory_data', 'w') as f_log:
+        for line in hit_maps:
+            f_log.write(' '.join(line) + '\n')
+
+if __name__ == '__main__':
+
+    parser = ArgumentParser(description='Write synthetic logfiles of the MPA '
+                            'Light DAQ.')
+    parser.add_argument('path', help='directory to write the logfiles to (the '
+                        'timestamp is appended to the logfile names)')
+    parser.add_argument('--timestamp', default='111',
+                        help='timestamp in the logfile names')
+    parser.add_argument('--shutters', type=int, default=100,
+                        help='number of shutters')
+    parser.add_argument('--occupancy', type=float, default=.05,
+                        help='probability of a hit per pixel in hit maps')
+    parser.add_argument('--slots', type=float, default=2.,
+                        help='mean number of occupied memory slots per '
+                        'shutter')
+    parser.add_argument('--bx-mean', type=float, default=10.,
+                        help='mean bunch crossing')
+    parser.add_argument('--bx-width', type=float, default=2.,
+                        help='width of bunch crossing distribution')
+    parser.add_argument('--bx-noise', type=float, default=.1,
+                        help='fraction of uniformly distributed bunch '
+                        'crossings')
+    parser.add_argument('--counts', type=float, default=20.,
+                        help='mean ripple counter per pixel and shutter')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='seed of the random numbers')
+    args = parser.parse_args()
+
+    generate(args.path, args.timestamp, args.shutters, args.occupancy,
+             args.slots, args.bx_mean, args.bx_width, args.bx_noise,
+             args.counts, args.seed)
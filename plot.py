@@ -3,47 +3,260 @@
 """ Author: Basil Schneider <basil.schneider@cern.ch>
 Get plots from MPA measurements. """
 
-from sys import argv
+from argparse import ArgumentParser
+from inspect import getsourcefile
+from sys import exit
+from time import sleep
+from ParseCache import ParseCache
+from Renderer import Renderer
+from Plotter import Plotter
 from RippleCounter import RippleCounter
 from BunchCrossing import BunchCrossing
 from HitMap import HitMap
 from SynchronousData import SynchronousData
+from LogFollower import LogFollower
+from Tasks import TaskGraph
+from Profiler import Profiler
+from MPA import MPA
+from Accumulator import Accumulator
+from Geometry import Geometry
+from LazyRoot import get_root
+from SyncEvents import SyncEvents
+import HitMapDecoder
+import Settings
 
-if __name__ == '__main__':
+def follow(path_logs, path_timestamp, interval, max_idle=None):
 
-    # Get the path to the logs
-    path_logs = argv[1]
-    # Need timestamp from path, this method is not foolproof!
-    path_timestamp = path_logs[path_logs.find('daqout'):].split('_')[3]
+    """ Update the plot families of single logfiles (ripple maps, counts per
+    BX and hit maps) while the logfiles are being written. Stop after
+    max_idle seconds without new data (never if None). The other families
+    are not updated, since they are slow (ripples per shutter and counts per
+    pixel and BX) or need the memory_bx and memory_data logfiles to be in
+    sync (counts per pixel and BX). """
+
+    # The histograms of each refresh have the same names, keep them out of
+    # the current directory so they do not replace each other there
+    get_root().TH1.AddDirectory(False)
 
     rc = RippleCounter()
+    bx = BunchCrossing()
+    hm = HitMap()
+    followers = [('ripples_maps',
+                  LogFollower(rc, '%s/log_%s.log_counter' %
+                              (path_logs, path_timestamp)), rc.plot_maps),
+                 ('counts_per_bx',
+                  LogFollower(bx, '%s/log_%s.log_memory_bx' %
+                              (path_logs, path_timestamp)), bx.plot_cts_bx),
+                 ('hit_maps',
+                  LogFollower(hm, '%s/log_%s.log_memory_data' %
+                              (path_logs, path_timestamp)), hm.plot_maps)]
 
-    # Read in data from raw log file and store it in MPA object
-    rc.read_data_raw('%s/log_%s.log_counter' % (path_logs, path_timestamp))
+    print 'Following %s; run without --follow for the other plot families.' \
+        % ', '.join(name for name, _, _ in followers)
 
-    # Plot ripples vs. shutter
-    rc.plot_ripples_shutter('%s/plots/ripples_per_shutter/' % path_logs)
+    idle = 0.
+    while max_idle is None or idle < max_idle:
+        updated = False
+        for name, follower, plot in followers:
+            # Only plot families which got new data
+            if follower.update() > 0:
+                plot('%s/plots/%s/' % (path_logs, name))
+                updated = True
 
-    # Plot 2d maps
-    rc.plot_maps('%s/plots/ripples_maps/' % path_logs)
+        if updated:
+            Renderer.wait()
+            print 'Read %s lines.' % ', '.join(str(follower.get_no_lines())
+                                               for _, follower, _ in followers)
+            idle = 0.
+        else:
+            idle += interval
 
-    bx = BunchCrossing()
+        sleep(interval)
 
-    # Read in data from raw log file and store it in MPA object
-    bx.read_data_raw('%s/log_%s.log_memory_bx' % (path_logs, path_timestamp))
+def get_tasks(path_logs, path_timestamp):
 
-    # Plot counts vs. bunch crossing
-    bx.plot_cts_bx('%s/plots/counts_per_bx/' % path_logs)
+    """ Return task graph with the reads of the logfiles and the plot
+    families. A plot family is out of date if its directory is empty, if it
+    did not finish (see Tasks), if it was written in the other output mode
+    (bundles or single files) or if it is older than the logfiles or the
+    code it needs. """
 
-    hm = HitMap()
+    log_rc = '%s/log_%s.log_counter' % (path_logs, path_timestamp)
+    log_bx = '%s/log_%s.log_memory_bx' % (path_logs, path_timestamp)
+    log_hm = '%s/log_%s.log_memory_data' % (path_logs, path_timestamp)
+    src_rc = getsourcefile(RippleCounter)
+    src_bx = getsourcefile(BunchCrossing)
+    src_hm = getsourcefile(HitMap)
+    src_sd = getsourcefile(SynchronousData)
+
+    # Code needed by all plot families
+    src_common = [getsourcefile(code) for code
+                  in [Plotter, Accumulator, Renderer, Geometry, HitMapDecoder,
+                      MPA, ParseCache]]
+
+    def read(plotter, logfile):
+        # Read in data from raw log file and store it in MPA object
+        plotter.read_data_raw(logfile)
+        return plotter
+
+    tasks = TaskGraph('bundle' if Renderer.bundle else 'files')
+
+    # Reads, only run if a plot family needing them is run
+    tasks.add('read_counter', lambda: read(RippleCounter(), log_rc))
+    tasks.add('read_memory_bx', lambda: read(BunchCrossing(), log_bx))
+    tasks.add('read_memory_data', lambda: read(HitMap(), log_hm))
+    tasks.add('synchronous_data', SynchronousData,
+              deps=['read_memory_bx', 'read_memory_data'])
+
+    # Plot families
+    plots = '%s/plots' % path_logs
+    tasks.add('ripples_per_shutter',
+              lambda rc: rc.plot_ripples_shutter('%s/ripples_per_shutter/'
+                                                 % plots),
+              deps=['read_counter'], inputs=[log_rc, src_rc] + src_common,
+              outputs=['%s/ripples_per_shutter' % plots],
+              stamp='%s/.ripples_per_shutter.stamp' % plots)
+    tasks.add('ripples_maps',
+              lambda rc: rc.plot_maps('%s/ripples_maps/' % plots),
+              deps=['read_counter'], inputs=[log_rc, src_rc] + src_common,
+              outputs=['%s/ripples_maps' % plots],
+              stamp='%s/.ripples_maps.stamp' % plots)
+    tasks.add('counts_per_bx',
+              lambda bx: bx.plot_cts_bx('%s/counts_per_bx/' % plots),
+              deps=['read_memory_bx'], inputs=[log_bx, src_bx] + src_common,
+              outputs=['%s/counts_per_bx' % plots],
+              stamp='%s/.counts_per_bx.stamp' % plots)
+    tasks.add('hit_maps',
+              lambda hm: hm.plot_maps('%s/hit_maps/' % plots),
+              deps=['read_memory_data'], inputs=[log_hm, src_hm] + src_common,
+              outputs=['%s/hit_maps' % plots],
+              stamp='%s/.hit_maps.stamp' % plots)
+    tasks.add('counts_per_px_bx',
+              lambda sd: sd.plot_cts_bx_px('%s/counts_per_px_bx' % plots),
+              deps=['synchronous_data'],
+              inputs=[log_bx, log_hm, src_bx, src_hm, src_sd,
+                      getsourcefile(SyncEvents)] + src_common,
+              outputs=['%s/counts_per_px_bx' % plots],
+              stamp='%s/.counts_per_px_bx.stamp' % plots)
+
+    return tasks
+
+def get_timestamp(path_logs):
+
+    """ Return timestamp of the logfiles in directory path_logs. """
+
+    # Need timestamp from path, this method is not foolproof!
+    return path_logs[path_logs.find('daqout'):].split('_')[3]
+
+def plot_directory(path_logs, only=(), skip=(), force=False):
+
+    """ Produce the plot families of the logfiles in directory path_logs
+    (all or only the ones in only, without the ones in skip) and wait until
+    they are written. Return lists of the families produced and of the ones
+    skipped since they are up to date. """
+
+    tasks = get_tasks(path_logs, get_timestamp(path_logs))
+    families = tasks.get_targets()
+    check_families(families, list(only) + list(skip))
+    selected = [name for name in only or families if name not in skip]
+
+    # Wait until all plots are written before the families are marked as
+    # finished
+    def wait():
+        with Profiler.stage('wait'):
+            Renderer.wait()
+
+    return tasks.run(selected, force, wait)
+
+def check_families(families, names):
+
+    """ Raise ValueError if one of names is not in families. """
+
+    for name in names:
+        if name not in families:
+            raise ValueError('unknown plot family %s, choose from %s'
+                             % (name, ', '.join(families)))
+
+def get_names(option):
+
+    """ Return list of task names from comma separated option. """
+
+    return [name for name in option.split(',') if name]
+
+if __name__ == '__main__':
+
+    parser = ArgumentParser(description='Get plots from MPA measurements.')
+    parser.add_argument('path_logs', help='directory containing the logfiles')
+    parser.add_argument('--only', default='',
+                        help='comma separated plot families to produce '
+                        '(default all)')
+    parser.add_argument('--skip', default='',
+                        help='comma separated plot families not to produce')
+    parser.add_argument('--force', action='store_true',
+                        help='produce plot families even if they are up to '
+                        'date')
+    parser.add_argument('--list', action='store_true',
+                        help='list the plot families and exit')
+    parser.add_argument('--profile', nargs='?', const=Profiler.path,
+                        default=None, metavar='REPORT',
+                        help='record time, counts and memory of the stages '
+                        'and write them to REPORT (default %s)'
+                        % Profiler.path)
+    parser.add_argument('--no-cache', action='store_true',
+                        help='do not use the cache of parsed logfiles')
+    parser.add_argument('--out-of-core', default=MPA.storage_dir,
+                        metavar='DIR',
+                        help='store the data in memory-mapped files in DIR '
+                        'instead of memory, for very long runs')
+    parser.add_argument('--jobs', type=int, default=Settings.get_jobs(),
+                        help='number of processes computing the MPAs and '
+                        'rendering the plots')
+    parser.add_argument('--bundle', action='store_true',
+                        help='write the plots of each family into one '
+                        'multi-page PDF')
+    parser.add_argument('--follow', action='store_true',
+                        help='update the ripple maps, counts per BX and hit '
+                        'maps while the DAQ is writing the logfiles')
+    parser.add_argument('--interval', type=float, default=10.,
+                        help='seconds between updates in follow mode')
+    parser.add_argument('--max-idle', type=float, default=None,
+                        help='stop follow mode after this many seconds '
+                        'without new data')
+    args = parser.parse_args()
+
+    if args.no_cache:
+        ParseCache.enabled = False
+    MPA.storage_dir = args.out_of_core
+    Settings.set_jobs(args.jobs)
+    Renderer.bundle = args.bundle
+    if args.profile:
+        Profiler.enabled = True
+        Profiler.path = args.profile
+
+    # Get the path to the logs
+    path_logs = args.path_logs
+
+    if args.follow:
+        follow(path_logs, get_timestamp(path_logs), args.interval,
+               args.max_idle)
+        exit()
+
+    families = get_tasks(path_logs, get_timestamp(path_logs)).get_targets()
+    if args.list:
+        print '\n'.join(families)
+        exit()
 
-    # Read in data from raw log file and store it in MPA object
-    hm.read_data_raw('%s/log_%s.log_memory_data' % (path_logs, path_timestamp))
+    # Only the selection is checked here, errors of the run are not usage
+    # errors
+    only, skip = get_names(args.only), get_names(args.skip)
+    try:
+        check_families(families, only + skip)
+    except ValueError as error:
+        parser.error(str(error))
 
-    # Plot hit maps
-    hm.plot_maps('%s/plots/hit_maps/' % path_logs)
+    done, skipped = plot_directory(path_logs, only, skip, args.force)
 
-    sd = SynchronousData(bx, hm)
+    if skipped:
+        print 'Up to date: %s' % ', '.join(skipped)
 
-    # Plot counts vs. bunch crossing separate for each pixel
-    sd.plot_cts_bx_px('%s/plots/counts_per_px_bx' % path_logs)
+    Profiler.write_report()
@@ -6,12 +6,13 @@ Get plots from MPA measurements. """
 from sys import argv
 from os import mkdir
 from glob import glob
-from ROOT import TH1F, TH2F, TCanvas, TLegend
-from ROOT import kRed, kViolet, kBlue, kGreen, kPink, kMagenta
-from RippleCounter import RippleCounter
-from BunchCrossing import BunchCrossing
-from HitMap import HitMap
-from SynchronousData import SynchronousData
+import numpy as np
+from ScanLoader import ScanLoader
+from Accumulator import Accumulator
+from CountTensor import CountTensor
+import Efficiency
+from ParseCache import ParseCache
+from LazyRoot import get_root
 
 def set_style_color(histo, idx):
     if idx == 0:
@@ -29,8 +30,34 @@ def set_style_color(histo, idx):
     if 'px23' in histo.GetName():
         histo.SetLineStyle(6)
 
+def get_logs(loader, path_logs, bxs_plot, cor_xs, hits_sync, hits_async):
+
+    """ Return generator of the logs of loader for CountTensor.from_logs().
+    The position, the synchronous hits in the BX's bxs_plot and the
+    asynchronous hits (MPAs x pixels) of each log are appended to cor_xs,
+    hits_sync and hits_async. """
+
+    for _, cor_x, delay, rows, rows_async in loader.load(path_logs):
+        cor_xs.append(cor_x)
+        rows_plot = rows[np.in1d(rows['bx'], bxs_plot)]
+        rows_plot['log'] = 0
+        hits_sync.append(Efficiency.count_hits(rows_plot, 1)[0])
+        hits_async.append(rows_async)
+        yield cor_x, delay, rows, rows_async
+
 if __name__ == '__main__':
 
+    # Use --no-cache to not use the cache of parsed logfiles
+    if '--no-cache' in argv:
+        argv.remove('--no-cache')
+        ParseCache.enabled = False
+
+    # ROOT is only imported (in batch mode) by the script, not by the modules
+    # loading the data
+    get_root()
+    from ROOT import TH1F, TH2F, TCanvas, TLegend
+    from ROOT import kRed, kViolet, kBlue, kGreen, kPink, kMagenta
+
     mpa_plot = 4
     pxs_plot = [22, 23]
     bxs_plot = [8, 9, 10, 11]
@@ -48,6 +75,7 @@ if __name__ == '__main__':
     bin_hi_y_eff = 50
     n = 1000
     canvas = TCanvas()
+    loader = ScanLoader(microstep)
 
     n = float(n)
     titleeff2d22 = 'effs_2d_px22'
@@ -66,43 +94,9 @@ if __name__ == '__main__':
         glob_logs = arg
         path_logs = glob('../daqlogs/*{0}*'.format(glob_logs))
 
-        hms = []
-        bxs = []
-        rcs = []
-        for path_log in path_logs:
-            # Need timestamp from path, this method is not foolproof!
-            path_timestamp = path_log[path_log.find('daqout'):].split('_')[3]
-
-            # Initialize Hit Map objects
-            hm = HitMap()
-            hm.read_data_raw('%s/log_%s.log_memory_data' %
-                             (path_log, path_timestamp))
-
-            for mpa in hm.get_mpas():
-                # Get rid of all 0's in data
-                mpa.trim_no_hits_shutter()
-
-                # Convert hit maps to list of pixels with hits
-                mpa.convert_hm_to_px()
-
-            hms.append(hm)
-
-            # Initialize Bunch Crossing objects
-            bx = BunchCrossing()
-            bx.read_data_raw('%s/log_%s.log_memory_bx' %
-                             (path_log, path_timestamp))
-
-            # Get rid of all 0's in data
-            for mpa in bx.get_mpas():
-                mpa.trim_no_hits_shutter()
-
-            bxs.append(bx)
-
-            # Initialize Ripple Counter objects
-            rc = RippleCounter()
-            rc.read_data_raw('%s/log_%s.log_counter' % (path_log, path_timestamp))
-
-            rcs.append(rc)
+        if not path_logs:
+            print 'No logs found for {0}.'.format(glob_logs)
+            continue
 
         # Print out some information about data for debugging
         # (limit print out to 12 elements, since it's too much information otherwise)
@@ -131,6 +125,42 @@ if __name__ == '__main__':
 
         mkdir(arg)
 
+        # Load the logs (in parallel with MPA_JOBS > 1), ordered by scan
+        # coordinates. The hits of all MPAs, pixels and BX's versus position
+        # and delay are counted log by log, the plots are slices of them
+        cor_xs = []
+        hits_sync_all = []
+        rows_async = []
+        counts = CountTensor.from_logs(get_logs(loader, path_logs, bxs_plot,
+                                                cor_xs, hits_sync_all,
+                                                rows_async))
+        counts.save('{0}/counts.npz'.format(arg))
+        grid_x, grid_delay = [grid.ravel() for grid in counts.get_grid()]
+        bxs = counts.get_bxs()
+        bxs = bxs[np.in1d(bxs, bxs_plot)]
+        grid_x_bx = np.tile(grid_x, len(bxs))
+        grid_bx = np.repeat(bxs, len(grid_x))
+
+        # Efficiencies and their variances of all MPAs and pixels (logs x
+        # MPAs x pixels), synchronous hits in the BX's to plot
+        hits_sync_all = np.array(hits_sync_all)
+        hits_async_all = np.array(rows_async)
+        effs = Efficiency.get_efficiency(hits_sync_all, n)
+        effs_var = Efficiency.get_variance(hits_sync_all, n)
+        effa = Efficiency.get_efficiency(hits_async_all, n)
+        effa_var = Efficiency.get_variance(hits_async_all, n)
+        sync_above_async = Efficiency.get_sync_above_async(hits_sync_all,
+                                                           hits_async_all)
+        for idx_log, idx_mpa, idx_px in zip(*np.nonzero(sync_above_async)):
+            print 'Found more hits in synchronous readout as in',
+            print 'asynchronous readout for MPA %s, pixel %s at x = %s:' \
+                % (idx_mpa, idx_px, cor_xs[idx_log]),
+            print '%s > %s' % (hits_sync_all[idx_log, idx_mpa, idx_px],
+                               hits_async_all[idx_log, idx_mpa, idx_px])
+
+        acc_all = Accumulator(histoall)
+        acc_async_all = Accumulator(histoasyncall)
+
         for px_plot in pxs_plot:
             titlepx = 'cts_vs_x_bxall_px{0}'.format(px_plot)
             histopx = TH1F(titlepx, titlepx, no_bins_x, bin_lo_x, bin_hi_x)
@@ -151,6 +181,37 @@ if __name__ == '__main__':
             histo2px = TH2F(title2px, title2px, no_bins_x, bin_lo_x, bin_hi_x,
                             no_bins_y, bin_lo_y, bin_hi_y)
 
+            # Fill async plots (independent of BX's)
+            hits_async_px = counts.get_async(mpa_plot, px_plot).ravel()
+            Accumulator(histoasyncpx).fill(grid_x, weights=hits_async_px).flush()
+            acc_async_all.fill(grid_x, weights=hits_async_px)
+            acc_async_eff = Accumulator(histoasyncpxeff)
+            acc_async_eff.fill(cor_xs, weights=effa[:, mpa_plot, px_plot],
+                               variances=effa_var[:, mpa_plot, px_plot])
+            acc_async_eff.flush()
+
+            # Fill sync plots (all BX's)
+            hits_px = counts.get_sync(mpa_plot, px_plot, bxs_plot).ravel()
+            Accumulator(histopx).fill_counts(grid_x, counts=hits_px).flush()
+            Accumulator(histopxeff).fill(
+                cor_xs, weights=effs[:, mpa_plot, px_plot],
+                variances=effs_var[:, mpa_plot, px_plot]).flush()
+            Accumulator(histopxeffdiv).fill(
+                cor_xs, weights=effs[:, mpa_plot, px_plot],
+                variances=effs_var[:, mpa_plot, px_plot]) \
+                .divide(acc_async_eff).flush()
+            hits_bx = counts.get_sync_bx(mpa_plot, px_plot)
+            hits_bx = hits_bx[np.in1d(counts.get_bxs(), bxs_plot)]
+            Accumulator(histo2px).fill_counts(grid_x_bx, grid_bx,
+                                              hits_bx).flush()
+            acc_all.fill_counts(grid_x, counts=hits_px)
+            if px_plot == 22:
+                Accumulator(histoeff2d22).fill_counts(grid_x, grid_delay,
+                                                      hits_px, 1./n).flush()
+            if px_plot == 23:
+                Accumulator(histoeff2d23).fill_counts(grid_x, grid_delay,
+                                                      hits_px, 1./n).flush()
+
             for idx_bx, bx_plot in enumerate(bxs_plot):
 
                 title = 'cts_vs_x_bx{0}_px{1}'.format(bx_plot, px_plot)
@@ -159,46 +220,11 @@ if __name__ == '__main__':
                 titleeff = 'effs_vs_x_bx{0}_px{1}'.format(bx_plot, px_plot)
                 histoeff = TH1F(titleeff, titleeff, no_bins_x, bin_lo_x, bin_hi_x)
 
-                for idx_log, path_log in enumerate(path_logs):
-                    # Find the x position, this is hardcoded for now
-                    #cor_x = int(path_log.split('_')[-1].lstrip('x')) + 600
-                    cor_x = int(path_log.split('X')[1].split('_')[0]) - 917000
-                    cor_x *= microstep
-
-                    # Find the delay, this is hardcoded for now
-                    delay = float(path_log.split('to')[1].split('ns')[0])
-
-                    # Fill async plots (independent of BX's)
-                    if idx_bx == 0:
-                        histoasyncpx.Fill(cor_x, rcs[idx_log].get_mpas()[mpa_plot]
-                                          .get_no_hits()[px_plot])
-                        histoasyncall.Fill(cor_x, rcs[idx_log].get_mpas()[mpa_plot]
-                                           .get_no_hits()[px_plot])
-                        histoasyncpxeff.Fill(cor_x, (rcs[idx_log].get_mpas()[mpa_plot]
-                                             .get_no_hits()[px_plot])/n)
-
-                    for idx_shutter in range(0, len(bxs[idx_log].get_mpas()[mpa_plot]
-                                                    .get_no_hits_shutter())):
-                        bxs_shutter = \
-                            bxs[idx_log].get_mpas()[mpa_plot].get_no_hits_shutter()[idx_shutter]
-                        hms_shutter = \
-                            hms[idx_log].get_mpas()[mpa_plot].get_no_hits_shutter()[idx_shutter]
-
-                        for idx_clk in range(0, len(bxs_shutter)):
-                            if bxs_shutter[idx_clk] == bx_plot:
-                                for hm_shutter in hms_shutter[idx_clk]:
-                                    if hm_shutter == px_plot:
-                                        histo.Fill(cor_x)
-                                        histoeff.Fill(cor_x, 1./n)
-                                        histoall.Fill(cor_x)
-                                        histopx.Fill(cor_x)
-                                        histopxeff.Fill(cor_x, 1./n)
-                                        histopxeffdiv.Fill(cor_x, 1./n)
-                                        histo2px.Fill(cor_x, bxs_shutter[idx_clk])
-                                        if hm_shutter == 22:
-                                            histoeff2d22.Fill(cor_x, delay, 1./n)
-                                        if hm_shutter == 23:
-                                            histoeff2d23.Fill(cor_x, delay, 1./n)
+                # Fill sync plots (one BX)
+                hits = counts.get_sync(mpa_plot, px_plot, bx_plot).ravel()
+                Accumulator(histo).fill_counts(grid_x, counts=hits).flush()
+                Accumulator(histoeff).fill_counts(grid_x, counts=hits,
+                                                  weight=1./n).flush()
 
                 canvas.cd()
                 histo.Draw()
@@ -233,7 +259,6 @@ if __name__ == '__main__':
             if histoasyncpxeff.Integral() > 0.:
                 l_effa.append(histoasyncpxeff)
 
-            histopxeffdiv.Divide(histoasyncpxeff)
             if histopxeffdiv.Integral() > 0.:
                 l_effs_effa.append(histopxeffdiv)
 
@@ -246,6 +271,9 @@ if __name__ == '__main__':
             canvas.Print('{0}/{1}.pdf'.format(arg, title2px))
             canvas.Clear()
 
+        acc_all.flush()
+        acc_async_all.flush()
+
         canvas.cd()
         histoall.Draw()
         histoall.SetTitle('Occupancy for all pixels in all BX\'s')
@@ -262,7 +290,7 @@ if __name__ == '__main__':
         canvas.Print('{0}/{1}.pdf'.format(arg, titleasyncall))
         canvas.Clear()
 
-        del histoall, histoasyncall
+        del histoall, histoasyncall, acc_all, acc_async_all
 
         # Plot synchronous efficiencies (per bx)
         leg = TLegend(.9, .5, 1., .9)
@@ -347,13 +375,6 @@ if __name__ == '__main__':
         leg = TLegend(.9, .5, 1., .9)
         for idx, histo in enumerate(l_effs_effa):
 
-            # Check for bins above 1
-            for bin in range(0, histo.GetNbinsX()+2):
-                if histo.GetBinContent(bin) > 1.:
-                    print 'Found bin with more hits in synchronous',
-                    print 'readout as in asynchronous readout.',
-                    print 'Bin content is %s' % (histo.GetBinContent(bin))
-
             set_style_color(histo, idx)
 
             if idx == 0:
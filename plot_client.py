@@ -0,0 +1,78 @@
+#!/usr/bin/env python2
+
+""" Author: Basil Schneider <basil.schneider@cern.ch>
+Get plots from MPA measurements from a running PlotDaemon. """
+
+from argparse import ArgumentParser
+from os.path import abspath
+from sys import exit
+from PlotDaemon import request, socket_path
+
+def print_job(job):
+
+    """ Print state of job. """
+
+    print 'Job %s (%s): %s' % (job['id'], job['path_logs'], job['state'])
+    if job.get('produced'):
+        print 'Produced: %s' % ', '.join(job['produced'])
+    if job.get('up_to_date'):
+        print 'Up to date: %s' % ', '.join(job['up_to_date'])
+    if job.get('error'):
+        print job['error']
+
+def get_names(option):
+
+    """ Return list of names from comma separated option. """
+
+    return [name for name in option.split(',') if name]
+
+if __name__ == '__main__':
+
+    parser = ArgumentParser(description='Get plots from MPA measurements '
+                            'from a running PlotDaemon (start it with '
+                            'PlotDaemon.py).')
+    parser.add_argument('path_logs', nargs='?',
+                        help='directory containing the logfiles')
+    parser.add_argument('--only', default='',
+                        help='comma separated plot families to produce '
+                        '(default all)')
+    parser.add_argument('--skip', default='',
+                        help='comma separated plot families not to produce')
+    parser.add_argument('--force', action='store_true',
+                        help='produce plot families even if they are up to '
+                        'date')
+    parser.add_argument('--no-wait', action='store_true',
+                        help='only submit the job, do not wait for it')
+    parser.add_argument('--status', action='store_true',
+                        help='show the jobs of the daemon')
+    parser.add_argument('--shutdown', action='store_true',
+                        help='stop the daemon')
+    parser.add_argument('--socket', default=socket_path,
+                        help='path of the Unix socket of the daemon (default '
+                        'from MPA_DAEMON)')
+    args = parser.parse_args()
+
+    if args.status:
+        for job in request({'command': 'status'}, args.socket)['jobs']:
+            print_job(job)
+        exit()
+
+    if args.shutdown:
+        request({'command': 'shutdown'}, args.socket)
+        exit()
+
+    if args.path_logs is None:
+        parser.error('path_logs is needed to submit a job')
+
+    # The daemon has its own working directory
+    id = request({'command': 'plot', 'path_logs': abspath(args.path_logs),
+                  'only': get_names(args.only), 'skip': get_names(args.skip),
+                  'force': args.force}, args.socket)['id']
+    if args.no_wait:
+        print 'Submitted job %s.' % id
+        exit()
+
+    job = request({'command': 'wait', 'id': id}, args.socket)['job']
+    print_job(job)
+    if job['state'] != 'done':
+        exit(1)
@@ -0,0 +1,32 @@
+#!/usr/bin/env python2
+
+""" Author: Basil Schneider <basil.schneider@cern.ch>
+Get plots from ROOT trees written by export_tree.py, filled with RDataFrame
+on all cores. """
+
+from argparse import ArgumentParser
+from Renderer import Renderer
+from RunTree import RunTree
+import Settings
+
+if __name__ == '__main__':
+
+    parser = ArgumentParser(description='Get plots from ROOT trees written by '
+                            'export_tree.py.')
+    parser.add_argument('path_tree', help='ROOT file with the trees')
+    parser.add_argument('--output', default='plots',
+                        help='directory of the plots (default plots)')
+    parser.add_argument('--threads', type=int, default=Settings.get_threads(),
+                        help='number of threads filling the histograms (0 '
+                        'for all cores, default from MPA_THREADS)')
+    parser.add_argument('--jobs', type=int, default=Settings.get_jobs(),
+                        help='number of processes rendering the plots')
+    args = parser.parse_args()
+
+    Settings.set_threads(args.threads)
+    Settings.set_jobs(args.jobs)
+
+    RunTree(args.path_tree).plot(args.output)
+
+    # Wait until all plots are written
+    Renderer.wait()
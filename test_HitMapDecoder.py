@@ -0,0 +1,80 @@
+#!/usr/bin/env python2
+
+""" Author: Basil Schneider <basil.schneider@cern.ch>
+Tests of the hit map decoder. """
+
+import unittest
+import numpy as np
+import HitMapDecoder
+
+class TestPack(unittest.TestCase):
+
+    """ Tests of HitMapDecoder.pack(). """
+
+    def setUp(self):
+
+        """ Hit maps of all lengths, with the first and last digit set. """
+
+        self.tokens = ['0', '1', '10', '101'] + \
+                      ['1' + '0'*(length-2) + '1'
+                       for length in range(2, HitMapDecoder.no_pxs+1)]
+        self.chunk_size = HitMapDecoder._chunk_size
+        self.pack_chunk = HitMapDecoder._pack_chunk
+
+    def tearDown(self):
+
+        """ Restore chunk size and chunk conversion. """
+
+        HitMapDecoder._chunk_size = self.chunk_size
+        HitMapDecoder._pack_chunk = self.pack_chunk
+
+    def test_words(self):
+
+        """ Words are the hit maps read as binary numbers. """
+
+        words = HitMapDecoder.pack(self.tokens)
+
+        self.assertEqual(words.dtype, np.int64)
+        self.assertEqual(words.tolist(), [int(token, 2)
+                                          for token in self.tokens])
+        self.assertEqual(HitMapDecoder.unpack(words),
+                         [int(token) for token in self.tokens])
+
+    def test_chunks(self):
+
+        """ Lists of tokens are converted in chunks of at most _chunk_size,
+        which bounds the memory of the temporary arrays. """
+
+        sizes = []
+        def pack_chunk(tokens):
+            sizes.append(len(tokens))
+            return self.pack_chunk(tokens)
+        HitMapDecoder._chunk_size = 5
+        HitMapDecoder._pack_chunk = pack_chunk
+
+        words = HitMapDecoder.pack(self.tokens)
+
+        self.assertEqual(words.tolist(), [int(token, 2)
+                                          for token in self.tokens])
+        self.assertEqual(sum(sizes), len(self.tokens))
+        self.assertTrue(max(sizes) <= 5)
+
+    def test_shape(self):
+
+        """ Nested lists keep their shape. """
+
+        words = HitMapDecoder.pack([[101, 1], [0, 111]])
+
+        self.assertEqual(words.tolist(), [[5, 1], [0, 7]])
+
+    def test_invalid(self):
+
+        """ Too long hit maps and digits other than 0 and 1 are rejected. """
+
+        with self.assertRaises(ValueError):
+            HitMapDecoder.pack(['1'*(HitMapDecoder.no_pxs+1)])
+        with self.assertRaises(ValueError):
+            HitMapDecoder.pack(['102'])
+
+if __name__ == '__main__':
+    unittest.main()
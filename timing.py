@@ -3,61 +3,76 @@
 """ Author: Basil Schneider <basil.schneider@cern.ch>
 Plot different timing delays after receiving the trigger. """
 
-from ROOT import gROOT, TH1F, THStack, TCanvas, TLegend
+from argparse import ArgumentParser
+from BunchCrossing import BunchCrossing
+from Accumulator import Accumulator
+from ParseCache import ParseCache
+from LazyRoot import get_root
+from Scan import Scan, rules
+import Settings
+
+# Binning of the BX histograms
+binning = (100, 0, 220)
 
 def get_data(logfile):
 
-    """ Get data from logfile and return list. """
+    """ Get BX distribution of all MPAs from logfile and return it as
+    Accumulator (without ROOT, so it can be computed in a worker process).
+    """
 
-    result = []
     timestamp = logfile[logfile.find('daqout'):].split('_')[3]
-    with open('%s/log_%s.log_memory_bx' % (logfile, timestamp), 'r') as f_log:
-        for line in f_log:
-            result.extend(list(filter(lambda l: l != 0,
-                                      [int(x) for x in line.split()])))
+    bx = BunchCrossing()
+    bx.read_data_raw('%s/log_%s.log_memory_bx' % (logfile, timestamp))
+    result = Accumulator.from_axes([binning])
+    for MPA in bx.get_mpas():
+        for data in MPA.iter_chunks():
+            result.fill(data[data != 0])
     return result
 
-def timing(data, leg_entries):
+def timing(data, leg_entries, path='timing.pdf'):
 
-    """ Plot different timing delays after receiving the trigger. """
+    """ Plot different timing delays after receiving the trigger. data is a
+    list of BX distributions (see get_data()). """
 
-    stack = THStack('stack', 'Counts per BX')
-    leg = TLegend(.8, .5, 1., .9)
-    for idx, list in enumerate(data):
-        h = TH1F('', '', 100, 0, 220)
+    ROOT = get_root()
+    stack = ROOT.THStack('stack', 'Counts per BX')
+    leg = ROOT.TLegend(.8, .5, 1., .9)
+    for idx, accumulator in enumerate(data):
+        h = ROOT.TH1F('', '', *binning)
         h.SetFillColor(idx+2)
         leg.AddEntry(h, leg_entries[idx], 'f')
-        for val in list:
-            h.Fill(val)
+        Accumulator(h).add(accumulator).flush()
         stack.Add(h)
-    canvas = TCanvas()
+    canvas = ROOT.TCanvas()
     stack.Draw()
     stack.GetXaxis().SetTitle('BX')
     stack.GetYaxis().SetTitle('Counts')
     leg.Draw()
-    canvas.SaveAs('timing.pdf')
+    canvas.SaveAs(path)
 
 if __name__ == '__main__':
-    gROOT.SetBatch(True)
-    data = []
-    leg_entries = ['delay 4 ns', 'delay 40 ns', 'delay 80 ns', 'delay 120 ns',
-                   'delay 160 ns', 'delay 200 ns', 'delay 300 ns', 'delay 400 ns',
-                   'delay 600 ns', 'delay 1 us', 'delay 1.5 us', 'delay 2 us',
-                   'delay 2.5 us', 'delay 3 us', 'delay 3.5 us', 'delay 4 us']
-    data.append(get_data('../daqlogs/daqout_default_noprocessing_115325235984_thr90_shdur1e4_nosh1e2_laserEXT_trigdelay4ns'))
-    data.append(get_data('../daqlogs/daqout_default_noprocessing_115402963022_thr90_shdur1e4_nosh1e2_laserEXT_trigdelay40ns'))
-    data.append(get_data('../daqlogs/daqout_default_noprocessing_115445817427_thr90_shdur1e4_nosh1e2_laserEXT_trigdelay80ns'))
-    data.append(get_data('../daqlogs/daqout_default_noprocessing_115530301588_thr90_shdur1e4_nosh1e2_laserEXT_trigdelay120ns'))
-    data.append(get_data('../daqlogs/daqout_default_noprocessing_115558063636_thr90_shdur1e4_nosh1e2_laserEXT_trigdelay160ns'))
-    data.append(get_data('../daqlogs/daqout_default_noprocessing_115618461435_thr90_shdur1e4_nosh1e2_laserEXT_trigdelay200ns'))
-    data.append(get_data('../daqlogs/daqout_default_noprocessing_115727229012_thr90_shdur1e4_nosh1e2_laserEXT_trigdelay300ns'))
-    data.append(get_data('../daqlogs/daqout_default_noprocessing_115754263549_thr90_shdur1e4_nosh1e2_laserEXT_trigdelay400ns'))
-    data.append(get_data('../daqlogs/daqout_default_noprocessing_115819255012_thr90_shdur1e4_nosh1e2_laserEXT_trigdelay600ns'))
-    data.append(get_data('../daqlogs/daqout_default_noprocessing_115844721454_thr90_shdur1e4_nosh1e2_laserEXT_trigdelay1000ns'))
-    data.append(get_data('../daqlogs/daqout_default_noprocessing_115907896283_thr90_shdur1e4_nosh1e2_laserEXT_trigdelay1500ns'))
-    data.append(get_data('../daqlogs/daqout_default_noprocessing_115939858337_thr90_shdur1e4_nosh1e2_laserEXT_trigdelay2000ns'))
-    data.append(get_data('../daqlogs/daqout_default_noprocessing_120013387535_thr90_shdur1e4_nosh1e2_laserEXT_trigdelay2500ns'))
-    data.append(get_data('../daqlogs/daqout_default_noprocessing_120036370973_thr90_shdur1e4_nosh1e2_laserEXT_trigdelay3000ns'))
-    data.append(get_data('../daqlogs/daqout_default_noprocessing_120100525519_thr90_shdur1e4_nosh1e2_laserEXT_trigdelay3500ns'))
-    data.append(get_data('../daqlogs/daqout_default_noprocessing_120124350545_thr90_shdur1e4_nosh1e2_laserEXT_trigdelay4000ns'))
-    timing(data, leg_entries)
+
+    parser = ArgumentParser(description='Plot BX distributions of the points '
+                            'of a scan.')
+    parser.add_argument('--pattern', default='daqout_*_trigdelay*ns',
+                        help='glob pattern of the names of the directories '
+                        'of the scan')
+    parser.add_argument('--variable', default='delay',
+                        choices=sorted(rules),
+                        help='scan variable, taken from the directory names')
+    parser.add_argument('--daqlogs', default='../daqlogs',
+                        help='directory containing the DAQ directories')
+    parser.add_argument('--jobs', type=int, default=Settings.get_jobs(),
+                        help='number of processes loading the points')
+    parser.add_argument('--output', default='timing.pdf',
+                        help='file to save the plot to')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='do not use the cache of parsed logfiles')
+    args = parser.parse_args()
+
+    if args.no_cache:
+        ParseCache.enabled = False
+    Settings.set_jobs(args.jobs)
+
+    scan = Scan(args.pattern, args.variable, args.daqlogs)
+    timing(scan.load(get_data), scan.get_labels(), args.output)